@@ -12,6 +12,9 @@ OPENBAR_DIR := $(realpath $(dir $(lastword ${MAKEFILE_LIST}))/../..)
 include ${OPENBAR_DIR}/includes/verify-environment.mk
 include ${OPENBAR_DIR}/includes/common.mk
 
+# Start the trace of this layer.
+$(call trace,B,'parse core/container/docker.mk',parse)
+
 # Load the configuration variables.
 ifeq ($(realpath ${CONFIG}),)
   $(error Configuration file not found)
@@ -22,14 +25,23 @@ endif
 # Include the common container makefile.
 include ${OPENBAR_DIR}/includes/container.mk
 
-# The "docker build" command line.
-CONTAINER_BUILD := docker build
+# The "docker build" command line. BuildKit is required for the cache mounts
+# used by the Dockerfiles to keep the downloaded packages between builds.
+CONTAINER_BUILD := DOCKER_BUILDKIT=1 docker build
 CONTAINER_BUILD += ${CONTAINER_BUILD_ARGS}
 
 ifneq (${OB_VERBOSE},0)
   CONTAINER_BUILD += --progress plain
 endif
 
+# Import and export the BuildKit layer cache. The exported cache replaces the
+# previous one once the build is done. Note that the default "docker" build
+# driver only supports it with the containerd image store.
+ifdef CONTAINER_CACHE_SAVE
+  CONTAINER_BUILD += --cache-from type=local,src=${CONTAINER_CACHE_PATH}
+  CONTAINER_BUILD += --cache-to type=local,dest=${CONTAINER_CACHE_PATH}.new,mode=max
+endif
+
 CONTAINER_BUILD += ${OB_DOCKER_BUILD_EXTRA_ARGS}
 CONTAINER_BUILD += ${OB_CONTAINER_CONTEXT}
 
@@ -39,27 +51,53 @@ CONTAINER_PULL += ${CONTAINER_PULL_ARGS}
 CONTAINER_PULL += ${OB_DOCKER_PULL_EXTRA_ARGS}
 CONTAINER_PULL += ${CONTAINER_TAG}
 
-# The "docker run" command line.
-CONTAINER_RUN := docker run
-CONTAINER_RUN += ${CONTAINER_RUN_ARGS}
+# Bind the local user and group using the docker entrypoint, unless the user
+# image is used where they are already created.
+DOCKER_USER_ARGS :=
 
-# Bind the local user and group using the docker entrypoint.
-CONTAINER_RUN += -v ${OPENBAR_DIR}/scripts/docker-entrypoint.sh:/sbin/docker-entrypoint.sh:ro
-CONTAINER_RUN += --entrypoint docker-entrypoint.sh
+ifndef CONTAINER_USER_TAG
+  DOCKER_USER_ARGS += -v ${OPENBAR_DIR}/scripts/docker-entrypoint.sh:/sbin/docker-entrypoint.sh:ro
+  DOCKER_USER_ARGS += --entrypoint docker-entrypoint.sh
 
-CONTAINER_RUN += -e OB_DOCKER_HOME=${OB_CONTAINER_HOME}
-CONTAINER_RUN += -e OB_DOCKER_UID=$$(id -u)
-CONTAINER_RUN += -e OB_DOCKER_GID=$$(id -g)
+  DOCKER_USER_ARGS += -e OB_DOCKER_HOME=${OB_CONTAINER_HOME}
+  DOCKER_USER_ARGS += -e OB_DOCKER_UID=$$(id -u)
+  DOCKER_USER_ARGS += -e OB_DOCKER_GID=$$(id -g)
 
-ifdef OB_DOCKER_GROUPS
-  CONTAINER_RUN += -e OB_DOCKER_GROUPS="${OB_DOCKER_GROUPS}"
+  ifdef OB_DOCKER_GROUPS
+    DOCKER_USER_ARGS += -e OB_DOCKER_GROUPS="${OB_DOCKER_GROUPS}"
+  endif
 endif
 
+# The "docker run" command line.
+CONTAINER_RUN := docker run
+CONTAINER_RUN += ${CONTAINER_RUN_ARGS}
+CONTAINER_RUN += ${DOCKER_USER_ARGS}
+
 # Add optional extra arguments.
 CONTAINER_RUN += ${OB_DOCKER_RUN_EXTRA_ARGS}
 
 # Use the previously build image.
-CONTAINER_RUN += ${CONTAINER_TAG}
+CONTAINER_RUN += ${CONTAINER_RUN_TAG}
+
+# The "docker run" command line of the hash equivalence server.
+ifdef CONTAINER_HASHSERV_NAME
+  CONTAINER_HASHSERV_RUN := docker run
+  CONTAINER_HASHSERV_RUN += ${CONTAINER_HASHSERV_ARGS}
+  CONTAINER_HASHSERV_RUN += ${DOCKER_USER_ARGS}
+  CONTAINER_HASHSERV_RUN += ${OB_DOCKER_RUN_EXTRA_ARGS}
+  CONTAINER_HASHSERV_RUN += ${CONTAINER_RUN_TAG}
+endif
+
+# Start the session container if needed and execute the commands inside it.
+ifdef CONTAINER_SESSION_NAME
+  CONTAINER_RUN := ${CONTAINER_SESSION_START} ${CONTAINER_RUN} ${CONTAINER_SESSION_IDLE}
+  CONTAINER_RUN += && docker exec ${CONTAINER_EXEC_ARGS}
+  CONTAINER_RUN += -u docker -e HOME=${OB_CONTAINER_HOME}
+  CONTAINER_RUN += ${CONTAINER_SESSION_NAME} ${CONTAINER_SESSION_EXEC}
+endif
 
 # Forward to the type layer.
 include ${OPENBAR_DIR}/includes/container_forward.mk
+
+# End the trace of this layer.
+$(call trace,E,'parse core/container/docker.mk',parse)
@@ -12,6 +12,9 @@ OPENBAR_DIR := $(realpath $(dir $(lastword ${MAKEFILE_LIST}))/../..)
 include ${OPENBAR_DIR}/includes/verify-environment.mk
 include ${OPENBAR_DIR}/includes/common.mk
 
+# Start the trace of this layer.
+$(call trace,B,'parse core/container/podman.mk',parse)
+
 # Load the configuration variables.
 ifeq ($(realpath ${CONFIG}),)
   $(error Configuration file not found)
@@ -28,6 +31,13 @@ CONTAINER_BUILD += ${CONTAINER_BUILD_ARGS}
 CONTAINER_BUILD += ${OB_PODMAN_BUILD_EXTRA_ARGS}
 CONTAINER_BUILD += ${OB_CONTAINER_CONTEXT}
 
+# The image saved in the build cache is loaded before building, and the build
+# is skipped if it is up to date.
+ifdef CONTAINER_CACHE_SAVE
+  CONTAINER_CACHE_LOAD := ${CONTAINER_CACHE} load ${CONTAINER_CACHE_ARGS}
+  CONTAINER_CACHE_LOAD += ${CONTAINER_SHA1}
+endif
+
 # The "podman pull" command line.
 CONTAINER_PULL := podman pull
 CONTAINER_PULL += ${CONTAINER_PULL_ARGS}
@@ -47,16 +57,46 @@ CONTAINER_RUN += --pids-limit=-1
 # Set the HOME, so ~ can be resolved.
 CONTAINER_RUN += -e HOME=${OB_CONTAINER_HOME}
 
-# Ensure HOME is writable.
-LOCAL_HOME := $(shell mktemp -d)
-CONTAINER_RUN := set -e; trap "rm -rf ${LOCAL_HOME}" EXIT; ${CONTAINER_RUN}
-CONTAINER_RUN += -v ${LOCAL_HOME}:${OB_CONTAINER_HOME}
+# The "podman run" command line of the hash equivalence server.
+ifdef CONTAINER_HASHSERV_NAME
+  CONTAINER_HASHSERV_RUN := podman run
+  CONTAINER_HASHSERV_RUN += ${CONTAINER_HASHSERV_ARGS}
+  CONTAINER_HASHSERV_RUN += --userns=keep-id --pids-limit=-1
+  CONTAINER_HASHSERV_RUN += ${OB_PODMAN_RUN_EXTRA_ARGS}
+  CONTAINER_HASHSERV_RUN += ${CONTAINER_RUN_TAG}
+endif
+
+# Ensure HOME is writable. The user image already contains a writable HOME,
+# and the persistent home directory is owned by the current user.
+ifneq ($(filter-out 0,${OB_CONTAINER_PERSISTENT_HOME})${CONTAINER_USER_TAG},)
+  ifdef CONTAINER_SESSION_NAME
+    CONTAINER_RUN := ${CONTAINER_SESSION_START} ${CONTAINER_RUN}
+  endif
+else ifdef CONTAINER_SESSION_NAME
+  LOCAL_HOME := ${CACHE_DIR}/session/${CONTAINER_SESSION_NAME}
+  CONTAINER_RUN := set -e; mkdir -p ${LOCAL_HOME}; ${CONTAINER_SESSION_START} ${CONTAINER_RUN}
+  CONTAINER_RUN += -v ${LOCAL_HOME}:${OB_CONTAINER_HOME}
+else
+  LOCAL_HOME := $(call trace-shell,mktemp,mktemp -d)
+  CONTAINER_RUN := set -e; trap "rm -rf ${LOCAL_HOME}" EXIT; ${CONTAINER_RUN}
+  CONTAINER_RUN += -v ${LOCAL_HOME}:${OB_CONTAINER_HOME}
+endif
 
 # Add optional extra arguments.
 CONTAINER_RUN += ${OB_PODMAN_RUN_EXTRA_ARGS}
 
 # Use the previously build image.
-CONTAINER_RUN += ${CONTAINER_TAG}
+CONTAINER_RUN += ${CONTAINER_RUN_TAG}
+
+# Start the session container if needed and execute the commands inside it.
+ifdef CONTAINER_SESSION_NAME
+  CONTAINER_RUN += ${CONTAINER_SESSION_IDLE}
+  CONTAINER_RUN += && podman exec ${CONTAINER_EXEC_ARGS}
+  CONTAINER_RUN += ${CONTAINER_SESSION_NAME} ${CONTAINER_SESSION_EXEC}
+endif
 
 # Forward to the type layer.
 include ${OPENBAR_DIR}/includes/container_forward.mk
+
+# End the trace of this layer.
+$(call trace,E,'parse core/container/podman.mk',parse)
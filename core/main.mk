@@ -32,6 +32,11 @@ ifeq ($(origin P),command line)
   OB_CONTAINER_FORCE_PULL := $(P)
 endif
 
+# Support the J= option in command line.
+ifeq ($(origin J),command line)
+  FOREACH_JOBS := $(J)
+endif
+
 # Support the V= option in command line.
 ifeq ($(origin V),command line)
   ifneq ($(V),0)
@@ -41,13 +46,20 @@ endif
 
 OB_VERBOSE ?= 0
 
+# Support the OB_TRACE option. The events of this make(1) instance are
+# identified using its process ID.
+ifdef OB_TRACE
+  override OB_TRACE := $(abspath ${OB_TRACE})
+  OB_TRACE_PID := $(shell echo $$PPID)
+endif
+
 # The container engine to be used.
 OB_CONTAINER_ENGINE ?= podman
 
-# Add all command line variables except B, O, P and V to the export list.
+# Add all command line variables except B, J, O, P and V to the export list.
 CLI_VARIABLES = $(foreach variable,${.VARIABLES},$(if $(filter command line,$(origin ${variable})),${variable}))
 
-override OB_EXPORT += $(filter-out B O P V,${CLI_VARIABLES})
+override OB_EXPORT += $(filter-out B J O P V,${CLI_VARIABLES})
 
 # All the required variables have been set.
 include ${OPENBAR_DIR}/includes/verify-environment.mk
@@ -55,6 +67,10 @@ include ${OPENBAR_DIR}/includes/verify-environment.mk
 # The common makefile can now be included.
 include ${OPENBAR_DIR}/includes/common.mk
 
+# Start the trace of this layer.
+$(call trace,M,'make ${MAKECMDGOALS}')
+$(call trace,B,'parse core/main.mk',parse)
+
 # Check if the "foreach" special target is used.
 HAVE_FOREACH := $(filter foreach,${MAKECMDGOALS})
 
@@ -66,7 +82,7 @@ endif
 DEFCONFIG_TARGETS := $(sort $(notdir $(wildcard ${OB_DEFCONFIG_DIR}/*_defconfig)))
 
 # The targets that do not require to have a configuration file.
-NO_CONFIG_TARGETS := ${DEFCONFIG_TARGETS} foreach ${FOREACH_TARGETS} help
+NO_CONFIG_TARGETS := ${DEFCONFIG_TARGETS} foreach ${FOREACH_TARGETS} help containers
 
 # These targets must be declared as soon as possible. This way, the shell
 # completion will work even if a configuration error occurs.
@@ -78,6 +94,44 @@ ${NO_CONFIG_TARGETS}:
 # - if the configuration is not required, ignore any configuration errors.
 TARGETS := $(if $(MAKECMDGOALS),$(MAKECMDGOALS),all)
 
+# The shell completion (make -npq), the other database dumps without recipes
+# (-np), the queries (-q) and the "help" target only need the list of targets.
+# This list is saved each time the configuration is loaded, and is reused
+# without parsing the configuration again as long as none of the makefiles it
+# reads (the configuration file, the files it includes and the env file of
+# the exported variables) are modified.
+TARGETS_CACHE := ${CACHE_DIR}/targets.mk
+TARGETS_CACHE_SHA1 := ${CACHE_DIR}/targets.sha1
+
+# The saved targets are checked too, and both files are only replaced, using a
+# temporary file, when their content changes. This way, a concurrent call never
+# reads a partial file, nor saved targets which do not match the sha1.
+TARGETS_CACHE_SHA1_UPDATE  = tmp=$$(mktemp ${TARGETS_CACHE_SHA1}.XXXXXX) &&
+TARGETS_CACHE_SHA1_UPDATE += sha1sum ${config-makefiles} ${TARGETS_CACHE} </dev/null >$${tmp} &&
+TARGETS_CACHE_SHA1_UPDATE += if cmp -s $${tmp} ${TARGETS_CACHE_SHA1}; then rm -f $${tmp};
+TARGETS_CACHE_SHA1_UPDATE += else mv -f $${tmp} ${TARGETS_CACHE_SHA1}; fi
+
+MAKEFLAGS_SHORT := $(call splitstr,$(filter-out -%,$(firstword ${MAKEFLAGS})))
+
+ifdef __BASH_MAKE_COMPLETION__
+  TARGETS_ONLY := yes
+else ifneq ($(filter q,${MAKEFLAGS_SHORT}),)
+  TARGETS_ONLY := yes
+else ifeq ($(words $(filter n p,${MAKEFLAGS_SHORT})),2)
+  TARGETS_ONLY := yes
+else ifeq ($(filter-out help,${TARGETS}),)
+  TARGETS_ONLY := yes
+endif
+
+define targets-cache
+OB_ALL_TARGETS := ${OB_ALL_TARGETS}
+OB_AUTO_TARGETS := ${OB_AUTO_TARGETS}
+OB_MANUAL_TARGETS := $(sort ${OB_MANUAL_TARGETS})
+.PHONY: ${OB_ALL_TARGETS}
+all: ${OB_AUTO_TARGETS}
+TARGETS_CACHED := yes
+endef
+
 ifeq ($(realpath ${CONFIG}),)
   ifneq ($(filter-out ${NO_CONFIG_TARGETS},${TARGETS}),)
     $(info Please use one of the following configuration targets:)
@@ -89,9 +143,45 @@ else
     CONFIG_IGNORE_ERROR := yes
   endif
 
-  $(call config-load-variables-override)
+  ifdef TARGETS_ONLY
+    CONFIG_IGNORE_ERROR := yes
+
+    ifneq ($(wildcard ${TARGETS_CACHE}),)
+      $(call config-env-file)
+
+      ifeq ($(call trace-shell,targets-cache,sha1sum --check --status ${TARGETS_CACHE_SHA1} 2>/dev/null && echo valid),valid)
+        include ${TARGETS_CACHE}
+      endif
+    endif
+  endif
+
+  ifndef TARGETS_CACHED
+    $(call config-load-variables-override)
+
+    ifndef CONFIG_ERROR
+      ifneq ($(file <${TARGETS_CACHE}),${targets-cache})
+        TARGETS_CACHE_TMP := $(shell mkdir -p ${CACHE_DIR} && mktemp ${TARGETS_CACHE}.XXXXXX)
+        $(file >${TARGETS_CACHE_TMP},${targets-cache})
+        $(shell mv -f ${TARGETS_CACHE_TMP} ${TARGETS_CACHE})
+      endif
+
+      $(call trace-shell,targets-cache,${TARGETS_CACHE_SHA1_UPDATE})
+    endif
+  endif
 endif
 
+# The cache eviction configuration (see the "cacheclean" target).
+OB_SSTATE_BUDGET   ?= 0
+OB_DL_BUDGET       ?= 0
+OB_CACHE_AUTOCLEAN ?= 0
+
+CACHE_EVICT_STAMP := ${CACHE_DIR}/last-build
+
+CACHE_EVICT = OB_VERBOSE=${OB_VERBOSE} ${OPENBAR_DIR}/scripts/cache-evict.sh
+CACHE_EVICT += ${CACHE_EVICT_STAMP}
+CACHE_EVICT += $(if ${SSTATE_DIR},${OB_SSTATE_BUDGET} ${SSTATE_DIR})
+CACHE_EVICT += $(if ${DL_DIR},${OB_DL_BUDGET} ${DL_DIR})
+
 ifneq (${HAVE_FOREACH},)
   # The "foreach" feature will execute the specified targets for each available
   # default configurations. The current configuration is kept and restored.
@@ -99,6 +189,15 @@ ifneq (${HAVE_FOREACH},)
   ${FOREACH_TARGETS}: foreach
 
   .PHONY: foreach
+  $(call trace-recipe,foreach,foreach,layer)
+
+  ifdef FOREACH_JOBS
+  # With the J= option, each default configuration is built in its own build
+  # directory using its own configuration file, so they can run concurrently.
+  foreach:
+	MAKE="${MAKE}" ${OPENBAR_DIR}/scripts/foreach.sh ${FOREACH_JOBS} \
+		${OB_BUILD_DIR}/foreach "${DEFCONFIG_TARGETS}" "${FOREACH_TARGETS}"
+  else
   foreach:
 	set -e; \
 	if [ -f ${CONFIG} ]; then \
@@ -110,15 +209,27 @@ ifneq (${HAVE_FOREACH},)
 	for target in ${DEFCONFIG_TARGETS}; do \
 		${MAKE} $${target} && ${MAKE} ${FOREACH_TARGETS}; \
 	done
+  endif
 else
   # All configuration targets are forwarded to the container layer.
   ifndef CONFIG_ERROR
     ifneq (${OB_ALL_TARGETS},)
+      $(call trace-recipe,.forward,core/container/${OB_CONTAINER_ENGINE}.mk,layer)
+
       ${OB_ALL_TARGETS}: .forward
 
+      # The start of the last OE/Yocto build is recorded, so that the cache
+      # entries it uses are not evicted. Once the build succeeded, the cache
+      # eviction can be run in the background.
       .PHONY: .forward
       .forward:
+    ifeq (${OB_TYPE},yocto)
+	touch ${CACHE_EVICT_STAMP}
+    endif
 	$(call submake,container/${OB_CONTAINER_ENGINE}.mk)
+    ifneq (${OB_CACHE_AUTOCLEAN},0)
+	nohup env ${CACHE_EVICT} >${CACHE_DIR}/cacheclean.log 2>&1 </dev/null &
+    endif
     endif
   endif
 endif
@@ -133,9 +244,43 @@ ${DEFCONFIG_TARGETS}:
 # The "containerclean" target.
 .PHONY: containerclean
 containerclean:
+	${OB_CONTAINER_ENGINE} ps -q \
+		--filter label=io.github.openbar.project_id=${OB_PROJECT_ID} \
+		--filter label=io.github.openbar.session \
+		| xargs -r ${OB_CONTAINER_ENGINE} rm -f ${QUIET}
+	${OB_CONTAINER_ENGINE} ps -q \
+		--filter label=io.github.openbar.project_id=${OB_PROJECT_ID} \
+		--filter label=io.github.openbar.hashserv \
+		| xargs -r ${OB_CONTAINER_ENGINE} rm -f ${QUIET}
 	${OB_CONTAINER_ENGINE} system prune -f \
 		--filter label=io.github.openbar.project_id=${OB_PROJECT_ID}
 
+# The "containergc" target. Unlike the "containerclean" target, the most recent
+# images of each container are kept, so that switching between configurations
+# or branches does not require to build them again.
+.PHONY: containergc
+containergc:
+	${CONTAINER_GC}
+
+# The "containers" target builds or pulls the container images of all the
+# default configurations, at most 4 (or J=n) at the same time, so that the
+# following targets do not have to wait for them.
+CONTAINERS_JOBS := $(or ${FOREACH_JOBS},4)
+
+.PHONY: containers
+containers:
+	MAKEFLAGS="${SUBMAKEJOBSERVER}" MAKE="${MAKE} ${SUBMAKEARGS}" \
+		${OPENBAR_DIR}/scripts/containers.sh ${CONTAINERS_JOBS} \
+		${OPENBAR_DIR}/core/container/${OB_CONTAINER_ENGINE}.mk \
+		${OB_DEFCONFIG_DIR} "${DEFCONFIG_TARGETS}"
+
+# The "cacheclean" target. The least recently used entries of the SSTATE_DIR
+# and of the DL_DIR are removed until they fit in the OB_SSTATE_BUDGET and the
+# OB_DL_BUDGET (see scripts/cache-evict.sh).
+.PHONY: cacheclean
+cacheclean:
+	${CACHE_EVICT}
+
 # The "help" target.
 .PHONY: help
 help:
@@ -160,15 +305,25 @@ endif
 	@echo 'Usefull targets:'
 	@echo '  help                 - Display this help'
 	@echo '  foreach [targets]    - Build targets for each configuration'
+	@echo '  containers           - Build or pull the images of all configurations'
 	@echo '  containerclean       - Clean all project-related dangling images'
+	@echo '  containergc          - Clean the old project images to their budget'
+	@echo '  cacheclean           - Clean the sstate and download caches to their budget'
 	@echo
 	@echo 'Command line options:'
 	@echo '  make V=0-1 [targets] 0 => quiet build (default)'
 	@echo '                       1 => verbose build'
 	@echo '  make O=dir [targets] Use the specified build directory (default: build)'
+	@echo '  make J=n foreach [targets]'
+	@echo '                       Build each configuration in its own build directory,'
+	@echo '                       running n builds concurrently'
+	@echo '  make J=n containers  Build or pull n images concurrently (default: 4)'
 ifneq (${OB_CONTAINER_DIR},)
 	@echo '  make B=0-1 [targets] 0 => force container not to be built'
 	@echo '                       1 => force container to be built'
 endif
 	@echo '  make P=0-1 [targets] 0 => force container not to be pulled'
 	@echo '                       1 => force container to be pulled'
+
+# End the trace of this layer.
+$(call trace,E,'parse core/main.mk',parse)
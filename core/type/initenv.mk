@@ -12,6 +12,9 @@ include ${OPENBAR_DIR}/includes/verify-environment.mk
 include ${OPENBAR_DIR}/includes/common.mk
 include ${OPENBAR_DIR}/includes/type.mk
 
+# Start the trace of this layer.
+$(call trace,B,'parse core/type/initenv.mk',parse)
+
 # Load the configuration variables.
 ifeq ($(realpath ${CONFIG}),)
   $(error Configuration file not found)
@@ -23,11 +26,12 @@ endif
 ${OB_ALL_TARGETS}: .forward
 
 ifeq (${OB_TYPE},yocto)
-  # The OE/Yocto layers must be reconfigured each times for the OB_YOCTO_LAYERS
-  # mechanism to work.
+  # The OE/Yocto layers must be reconfigured from the template each time the
+  # OB_YOCTO_LAYERS change, for the OB_YOCTO_LAYERS mechanism to work.
   .PHONY: .clean-bblayers
   .clean-bblayers:
-	rm -f ${OB_BUILD_DIR}/conf/bblayers.conf
+	${YOCTO_LAYERS} check ${YOCTO_LAYERS_ARGS} \
+		|| rm -f ${OB_BUILD_DIR}/conf/bblayers.conf
 
   .forward: .clean-bblayers
 
@@ -36,7 +40,12 @@ else
   NEXT_LAYER := type/simple.mk
 endif
 
+$(call trace-recipe,.forward,core/${NEXT_LAYER},layer)
+
 .PHONY: .forward
 .forward:
 	${QUIET} . ${OB_INITENV_SCRIPT} ${OB_BUILD_DIR} \
 		&& $(call submake,${NEXT_LAYER})
+
+# End the trace of this layer.
+$(call trace,E,'parse core/type/initenv.mk',parse)
@@ -14,6 +14,9 @@ include ${OPENBAR_DIR}/includes/verify-environment.mk
 include ${OPENBAR_DIR}/includes/common.mk
 include ${OPENBAR_DIR}/includes/type.mk
 
+# Start the trace of this layer.
+$(call trace,B,'parse core/type/simple.mk',parse)
+
 # Save the variables defined before to load the configuration variables.
 # Only keep variable names starting with an uppercase letter to avoid Make's
 # automatic variables (like %D, @F, ^D) being treated as patterns by
@@ -24,14 +27,19 @@ VARIABLES_BEFORE_LOAD := VARIABLES_BEFORE_LOAD $(filter $(addsuffix %,${UPPER}),
 ifeq ($(realpath ${CONFIG}),)
   $(error Configuration file not found)
 else
-  $(call config-load-variables)
-  $(call config-load-targets)
+  $(call config-load)
 endif
 
 # Export only the variables loaded from the configuration that start with an
 # uppercase letter. Variables starting with lowercase are considered private.
 export $(filter-out ${VARIABLES_BEFORE_LOAD},$(filter $(addsuffix %,${UPPER}),${.VARIABLES}))
 
+# Trace the configuration targets, except the interactive "shell" target.
+$(call foreach-eval,$(filter-out shell,${OB_ALL_TARGETS}),trace-target)
+
 # Add the "shell" target.
 shell:
 	${SHELL}
+
+# End the trace of this layer.
+$(call trace,E,'parse core/type/simple.mk',parse)
@@ -17,6 +17,9 @@ include ${OPENBAR_DIR}/includes/verify-environment.mk
 include ${OPENBAR_DIR}/includes/common.mk
 include ${OPENBAR_DIR}/includes/type.mk
 
+# Start the trace of this layer.
+$(call trace,B,'parse core/type/yocto.mk',parse)
+
 # Load the configuration variables.
 ifeq ($(realpath ${CONFIG}),)
   $(error Configuration file not found)
@@ -30,18 +33,18 @@ export ${OB_YOCTO_EXPORT_VARIABLE} = ${OB_EXPORT}
 # All targets are forwarded to the simple layer.
 ${OB_ALL_TARGETS}: .forward
 
+$(call trace-recipe,.forward,core/type/simple.mk,layer)
+$(call trace-recipe,.update-layers,bitbake-layers,yocto)
+
 .PHONY: .forward
-.forward: .validate-layers
+.forward: .update-layers
 	$(call submake,type/simple.mk)
 
-.PHONY: .validate-layers
-.validate-layers: .add-layers
-	${QUIET} bitbake-layers show-layers
+# Add the required bitbake layers and validate the configured bitbake layers,
+# unless they are already up to date.
+.PHONY: .update-layers
+.update-layers:
+	${YOCTO_LAYERS} update ${YOCTO_LAYERS_ARGS}
 
-.PHONY: .add-layers
-.add-layers:
-ifneq ($(strip ${OB_YOCTO_LAYERS}),)
-	for LAYER in ${OB_YOCTO_LAYERS}; do \
-		${QUIET} bitbake-layers add-layer -F $${LAYER}; \
-	done
-endif
+# End the trace of this layer.
+$(call trace,E,'parse core/type/yocto.mk',parse)
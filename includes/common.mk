@@ -22,6 +22,8 @@ ALNUM := ${ALPHA} ${DIGIT}
 EMPTY       :=
 COMMA       := ,
 COLON       := :
+HASH        := \#
+BACKSLASH   := \${EMPTY}
 SPACE       := ${EMPTY} ${EMPTY}
 VERTICALTAB := ${EMPTY}${EMPTY}
 
@@ -31,15 +33,36 @@ define NEWLINE :=
 endef
 
 # The configuration file.
-CONFIG := ${OB_ROOT_DIR}/.config
+ifdef OB_CONFIG_FILE
+  CONFIG := ${OB_CONFIG_FILE}
+else
+  CONFIG := ${OB_ROOT_DIR}/.config
+endif
+
+# The directory used to store the openbar internal files.
+CACHE_DIR := ${OB_BUILD_DIR}/.openbar
+
+# The configuration cache directory.
+CONFIG_CACHE_DIR := ${CACHE_DIR}/config
 
 # The container home directory.
 OB_CONTAINER_HOME := /home/container
 
+# The image garbage collection keeps the OB_CONTAINER_GC_KEEP most recent
+# images of each container ID within the OB_CONTAINER_GC_BUDGET (see
+# scripts/container-gc.sh).
+CONTAINER_GC = OB_VERBOSE=${OB_VERBOSE} ${OPENBAR_DIR}/scripts/container-gc.sh
+CONTAINER_GC += ${OB_CONTAINER_ENGINE} ${OB_PROJECT_ID}
+CONTAINER_GC += $(or ${OB_CONTAINER_GC_KEEP},2) $(or ${OB_CONTAINER_GC_BUDGET},0)
+
 ## unquote <string>
 # Removes single quotes from a string, especially one containing spaces.
 unquote = $(subst @@@@@,${SPACE},$(patsubst '%',%,$(subst ${SPACE},@@@@@,${1})))
 
+## shell-quote <string>
+# Quote a string to be used as a single shell argument.
+shell-quote = '$(subst ','\'',${1})'
+
 ## notfirstword <list>
 # Return all elements of the list except the first one.
 notfirstword = $(wordlist 2,$(words ${1}),${1})
@@ -52,25 +75,74 @@ splitstr = $(call splitstr_r,${ALNUM},${1})
 
 # The MAKEFLAGS to be used for sub-makefiles.
 SUBMAKEFLAGS  = $(filter s,$(call splitstr,$(filter-out -%,$(firstword ${MAKEFLAGS}))))
-SUBMAKEFLAGS += $(filter -j% --no-print-directory,${MAKEFLAGS})
+SUBMAKEFLAGS += $(filter --no-print-directory,${MAKEFLAGS})
 
 # The arguments to be used for sub-makefiles.
 SUBMAKEARGS = $(patsubst %,-%,$(patsubst -%,%,${SUBMAKEFLAGS}))
 
+# The jobs flags to be used for sub-makefiles.
+SUBMAKEJOBS = $(filter -j% --jobserver-auth=%,${MAKEFLAGS})
+
+# The jobs flags to be given using the MAKEFLAGS of sub-makefiles, so that they
+# share the jobserver and the number of jobs is bounded globally. Only a FIFO
+# jobserver (GNU make 4.4 or later) can be shared: the file descriptors of a
+# pipe jobserver are only inherited by the recipes known to be recursive, which
+# the forwarding recipes are not (as they do not run in dry-run mode).
+SUBMAKEJOBSERVER = $(if $(filter --jobserver-auth=fifo:%,${MAKEFLAGS}),${SUBMAKEJOBS})
+
 ## submake <makefile>
 # Call a sub-makefile inside the core directory.
-submake_noenv = ${MAKE} ${SUBMAKEARGS}  -f ${OPENBAR_DIR}/core/${1} ${MAKECMDGOALS}
-submake = MAKEFLAGS= $(call submake_noenv,${1})
+#
+# The submake_noenv variant does not use the environment (like inside the
+# container) and so uses its own jobs. The submake_nojobs variant does not
+# give any jobs flags, so they must be given using the environment. The
+# submake variant shares the jobserver if possible, or uses its own jobs.
+submake_nojobs = ${MAKE} ${SUBMAKEARGS} -f ${OPENBAR_DIR}/core/${1} ${MAKECMDGOALS}
+submake_noenv = $(call submake_nojobs,${1}) $(filter -j%,${SUBMAKEJOBS})
+submake = MAKEFLAGS="${SUBMAKEJOBSERVER}" $(if ${SUBMAKEJOBSERVER},$(call submake_nojobs,${1}),$(call submake_noenv,${1}))
 
 ## foreach-eval <list> <function>
 # For each unique element of the <list>, evaluate the specified <function> call.
 foreach-eval = $(foreach element,$(sort ${1}),$(eval $(call ${2},${element})))
 
+## trace <phase> <name> [<category>]
+# Record an event in the OB_TRACE file (see scripts/trace.sh).
+#
+## trace-shell <name> <command>
+# Call the $(shell) function and record its execution as a <name> event.
+#
+## trace-recipe <target> <name> <category>
+# Record each recipe line of the <target> as a <name> event. The SHELL of the
+# <target> is replaced by the trace script, which calls the original one.
+#
+## trace-target <target>
+# Record each recipe line of a configuration <target>, on its own track.
+#
+# Nothing is recorded unless OB_TRACE is set.
+ifdef OB_TRACE
+  TRACE_SCRIPT := ${OPENBAR_DIR}/scripts/trace.sh
+  TRACE := ${TRACE_SCRIPT} ${OB_TRACE} ${OB_TRACE_PID}
+
+  trace = $(shell ${TRACE} ${1} ${2} ${3})
+  trace-shell = $(shell ${TRACE} B ${1} shell; ${2}; ${TRACE} E ${1} shell)
+
+  define trace-recipe-noeval
+    ${1}: private SHELL := ${TRACE_SCRIPT}
+    ${1}: private .SHELLFLAGS := ${OB_TRACE} ${OB_TRACE_PID} run ${2} ${3} ${SHELL} ${.SHELLFLAGS}
+  endef
+
+  trace-recipe = $(eval $(call trace-recipe-noeval,${1},${2},${3}))
+  trace-target = $(call trace-recipe-noeval,${1},${1},target)
+else
+  trace-shell = $(shell ${2})
+endif
+
 # Add all public variables to the export list.
 override OB_EXPORT += $(filter OB_%,${.VARIABLES})
 
 # Add OE/Yocto related variables to the export list.
 ifeq (${OB_TYPE},yocto)
+  override OB_EXPORT += BB_HASHSERVE PERSISTENT_DIR PRSERV_HOST
   override OB_EXPORT += DEPLOY_DIR DL_DIR SSTATE_DIR
   override OB_EXPORT += DISTRO MACHINE
   override OB_EXPORT += OB_YOCTO_EXPORT_VARIABLE OB_YOCTO_LAYERS
@@ -80,14 +152,33 @@ endif
 # Ensure that values in OB_EXPORT are sorted and unique.
 override OB_EXPORT := $(sort ${OB_EXPORT})
 
-# Export all variables from the export list.
-define export-variable
-  ifdef ${1}
-    export ${1}
+## env-file <file> <variables> [<format>]
+# Write the defined <variables> to the <file>, one NAME=value per line after a
+# comment line. This is the format of the --env-file option of the container
+# engines. As on a command line, the values are unquoted, and the multi-line
+# values are joined. The file is only written when its content changes.
+#
+# With the "makefile" <format>, each line is an override directive instead,
+# whose value is escaped so that it is read as is by make(1).
+env-file-variables = $(foreach variable,$(sort ${1}),$(if $(value ${variable}),${variable}))
+env-file-value = $(subst ${NEWLINE},${SPACE},$(call unquote,${${1}}))
+env-file-line = ${1}=$(call env-file-value,${1})
+env-file-line-makefile = override ${1} := $(subst ${HASH},${BACKSLASH}${HASH},$(subst $$,$$$$,$(call env-file-value,${1})))
+env-file-content = \# openbar environment$(subst ${SPACE}${NEWLINE},${NEWLINE},$(foreach variable,$(call env-file-variables,${1}),${NEWLINE}$(call env-file-line$(addprefix -,${2}),${variable})))
+
+define env-file-noeval
+  env-file-lines := $$(call env-file-content,${2},${3})
+
+  ifneq ($$(file <${1}),$${env-file-lines})
+    $$(if $$(wildcard $(dir ${1})),,$$(shell mkdir -p $(dir ${1})))
+    $$(file >${1},$${env-file-lines})
   endif
 endef
 
-$(call foreach-eval,${OB_EXPORT},export-variable)
+env-file = $(eval $(call env-file-noeval,${1},${2},${3}))
+
+# Export all variables from the export list.
+export $(call env-file-variables,${OB_EXPORT})
 
 # To interpret and analyze the configuration file, it is read as a makefile.
 # Its database (the resulting variables and targets) is printed (option -p).
@@ -100,25 +191,54 @@ $(call foreach-eval,${OB_EXPORT},export-variable)
 # So each variables which needs to be exported have to be added in the command
 # line. The OB_EXPORT variable lists all the variables that will need to be
 # exported. This variable can be appended by the user.
-CONFIG_MAKE := ${MAKE} MAKE=true
+#
+# To keep the cost flat as the export list grows, these variables are written
+# once to an env file, specific to each layer, using the makefile format. It
+# is read before the configuration file, so that its override directives take
+# precedence like command line variables would. The trace variables are not
+# needed by the configuration. They are left out to keep the configuration
+# cache valid.
+CONFIG_ENV_FILE := ${CONFIG_CACHE_DIR}/$(basename $(notdir $(firstword ${MAKEFILE_LIST}))).env.mk
 
-define export-variable-config
-  ifdef ${1}
-    CONFIG_MAKE += ${1}="$(call unquote,${${1}})"
-  endif
-endef
+config-env-file = $(call env-file,${CONFIG_ENV_FILE},$(filter-out OB_TRACE%,${OB_EXPORT}),makefile)
 
-$(call foreach-eval,${OB_EXPORT},export-variable-config)
+CONFIG_MAKE := LC_ALL=C ${MAKE} MAKE=true -f ${CONFIG_ENV_FILE}
 
-## config-parse <script> [args]
-# Parse the configuration file using a specified <script>.
+## config-parse <args>
+# Parse the configuration file. The <args> are given to the parser script to
+# select the output (see scripts/config-parse.awk).
 #
 # The output uses the makefile format so it can be evaluated directly.
 #
 # By default the $(shell) function replaces newline characters with spaces.
 # So the script is using vertical tabs as separators, that are replaced by
 # newlines later.
-config-parse = $(subst ${VERTICALTAB},${NEWLINE},$(shell LC_ALL=C ${CONFIG_MAKE} -rRnpqf ${CONFIG} 2>&1 | awk ${2} -f ${1}))
+#
+# If OB_CONFIG_CACHE is enabled, the parsed output is cached in the build
+# directory. The cache is keyed by the CONFIG_MAKE command line, the content of
+# the CONFIG_ENV_FILE, the inherited environment, the <args> and the content of
+# the parser script (which may change when openbar is upgraded), and is reused
+# until the configuration file or any of the files it includes are modified
+# (see scripts/config-cache.sh).
+#
+# Note that the values computed by $(shell) when the configuration is read are
+# cached too, and are not computed again while the cache is valid. So it should
+# not be enabled for a configuration using $(shell) to get a value which may
+# change on its own, like a date or a git revision.
+CONFIG_PARSE_SCRIPT := ${OPENBAR_DIR}/scripts/config-parse.awk
+
+ifeq ($(filter-out 0,${OB_CONFIG_CACHE}),)
+  config-parse = $(call config-env-file)$(subst ${VERTICALTAB},${NEWLINE},$(call trace-shell,config-parse,${CONFIG_MAKE} -rRnpqf ${CONFIG} 2>&1 | awk -v ENV_FILE=${CONFIG_ENV_FILE} ${1} -f ${CONFIG_PARSE_SCRIPT}))
+else
+  config-parse = $(call config-env-file)$(subst ${VERTICALTAB},${NEWLINE},$(config-parse-cached))
+
+  # The command is written to a file to avoid any quoting issue.
+  config-parse-command = ${CONFIG_CACHE_DIR}/$(subst ${SPACE},-,$(patsubst %=1,%,$(filter-out -v,${1}))).sh
+
+  config-parse-cached = $(if $(wildcard ${CONFIG_CACHE_DIR}),,$(shell mkdir -p ${CONFIG_CACHE_DIR})) \
+    $(file >$(call config-parse-command,${1}),${CONFIG_MAKE} -rRnpqf ${CONFIG} 2>&1) \
+    $(call trace-shell,config-parse,OB_VERBOSE=${OB_VERBOSE} ${OPENBAR_DIR}/scripts/config-cache.sh ${CONFIG_CACHE_DIR} $(call config-parse-command,${1}) ${CONFIG_ENV_FILE} awk -v ENV_FILE=${CONFIG_ENV_FILE} ${1} -f ${CONFIG_PARSE_SCRIPT})
+endif
 
 ## config-load-variables
 # Load the variables from the configuration (and not the targets).
@@ -133,7 +253,7 @@ config-parse = $(subst ${VERTICALTAB},${NEWLINE},$(shell LC_ALL=C ${CONFIG_MAKE}
 #
 # The OB_AUTO_TARGETS are added as dependencies of the "all" target.
 define config-load-variables-noeval
-  $(call config-parse,${OPENBAR_DIR}/scripts/config-variables.awk,${1})
+  $(call config-parse,-v VARIABLES=1 ${1})
 
   OB_ALL_TARGETS += shell
   OB_MANUAL_TARGETS += shell
@@ -154,7 +274,12 @@ config-load-variables-override = $(eval $(call config-load-variables-noeval,-v O
 ## config-load-targets
 # Load the targets from the configuration (and not the variables).
 define config-load-targets-noeval
-  $(call config-parse,${OPENBAR_DIR}/scripts/config-targets.awk)
+  $(call config-parse,-v TARGETS=1)
 endef
 
 config-load-targets = $(eval $(call config-load-targets-noeval))
+
+## config-load
+# Load both the variables and the targets from the configuration, using a
+# single parse of the configuration file.
+config-load = $(eval $(call config-load-variables-noeval,-v TARGETS=1))
@@ -1,14 +1,19 @@
 ## container-volume <string>
 # Format the volume string to be container compliant.
-container-volume = $(shell echo ${1} | awk -f ${OPENBAR_DIR}/scripts/container-volume.awk)
+container-volume = $(call trace-shell,container-volume,echo ${1} | awk -f ${OPENBAR_DIR}/scripts/container-volume.awk)
 
 ## container-volume-hostdir <string>
 # Get the host directory from a container volume string.
 container-volume-hostdir = $(firstword $(subst ${COLON},${SPACE},${1}))
 
-## container-status [<file>]
+## container-status <accepted status> [<sha1>]
+# Return the container image status, unless it is one of the accepted status.
 #
-container-status = $(filter-out invalid ${1},$(shell OB_VERBOSE=${OB_VERBOSE} ${OPENBAR_DIR}/scripts/container-status.sh ${OB_CONTAINER_ENGINE} ${CONTAINER_TAG} ${2}))
+# The status is cached in a stamp file, so that the container engine is only
+# queried once while the image and its sha1 do not change.
+CONTAINER_STATUS_STAMP = ${CACHE_DIR}/container/$(subst /,-,$(subst :,-,${CONTAINER_TAG})).status
+
+container-status = $(filter-out invalid ${1},$(call trace-shell,container-status,OB_VERBOSE=${OB_VERBOSE} ${OPENBAR_DIR}/scripts/container-status.sh ${OB_CONTAINER_ENGINE} ${CONTAINER_TAG} ${CONTAINER_STATUS_STAMP} ${2}))
 
 # Choose whether to build or pull the container.
 ifeq (${OB_CONTAINER_DIR},)
@@ -21,6 +26,11 @@ endif
 
 # The default container configuration.
 OB_CONTAINER_POLICY     ?= newer
+OB_CONTAINER_SESSION    ?= 0
+OB_CONTAINER_SESSION_TIMEOUT ?= 600
+OB_CONTAINER_USER_IMAGE ?= 0
+OB_CONTAINER_JOBSERVER  ?= 0
+OB_CONTAINER_PERSISTENT_HOME ?= 0
 ifeq (${CONTAINER_COMMAND},pull)
   OB_CONTAINER_IMAGE    ?= ghcr.io/openbar/openbar:latest
 else
@@ -31,34 +41,106 @@ else
 endif
 
 # The generated container variables.
+#
+# The CONTAINER_SHA1 is the digest of the whole build context, so that any
+# modification of a copied file is detected (see scripts/container-digest.sh).
 ifeq (${CONTAINER_COMMAND},pull)
   CONTAINER_TAG         := ${OB_CONTAINER_IMAGE}
   CONTAINER_IMAGE       := $(firstword $(subst :,${SPACE},${CONTAINER_TAG}))
   CONTAINER_HOSTNAME    := $(subst /,-,${CONTAINER_IMAGE})
 else
-  CONTAINER_SHA1        := $(firstword $(shell sha1sum ${OB_CONTAINER_FILE}))
   CONTAINER_ID          := $(lastword $(subst /,${SPACE},${OB_CONTAINER_FILE:%/Dockerfile=%}))
   CONTAINER_TAG         := localhost/openbar/${OB_PROJECT_ID}/${CONTAINER_ID}:latest
   CONTAINER_HOSTNAME    := $(subst /,-,${OB_CONTAINER})
+  CONTAINER_MANIFEST    := ${CACHE_DIR}/container/${CONTAINER_HOSTNAME}.manifest
+  CONTAINER_SHA1        := $(call trace-shell,container-digest,OB_VERBOSE=${OB_VERBOSE} ${OPENBAR_DIR}/scripts/container-digest.sh ${OB_CONTAINER_CONTEXT} ${OB_CONTAINER_FILE} ${CONTAINER_MANIFEST})
 endif
 
-# Add all exported variables inside the container.
-CONTAINER_ENV_ARGS :=
+# The OE/Yocto servers configuration.
+#
+# The hash equivalence server is a bitbake-hashserv(1) running in a sidecar
+# container (see below). The PR server is started by bitbake itself. Both
+# databases are stored in the OB_YOCTO_SERVER_DIR, so that they are shared by
+# all the configurations of the project.
+ifeq (${OB_TYPE},yocto)
+  OB_YOCTO_HASHSERV   ?= 0
+  OB_YOCTO_PRSERV     ?= 0
+  OB_YOCTO_SERVER_DIR ?= ${OB_ROOT_DIR}/yocto-server
 
-define container-env-args
-  ifdef ${1}
-    CONTAINER_ENV_ARGS += -e ${1}="$(call unquote,${${1}})"
+  ifneq (${OB_YOCTO_HASHSERV},0)
+    override BB_HASHSERVE := unix://${OB_YOCTO_SERVER_DIR}/hashserv.sock
   endif
-endef
 
-$(call foreach-eval,OB_EXPORT ${OB_EXPORT},container-env-args)
+  ifneq (${OB_YOCTO_PRSERV},0)
+    override PRSERV_HOST := localhost:0
+    override PERSISTENT_DIR := ${OB_YOCTO_SERVER_DIR}/persistent
+  endif
+endif
+
+# Add all exported variables inside the container. They are written to an env
+# file (see env-file), so that the command line does not grow with the export
+# list. The file is named by the sha1 of its content, so that the concurrent
+# invocations using other values in the same build directory do not overwrite
+# the file of each other, which is only read when the container is started.
+CONTAINER_ENV_TMPFILE := $(call trace-shell,container-env,mkdir -p ${CACHE_DIR} && mktemp ${CACHE_DIR}/container.env.XXXXXX)
+
+$(call env-file,${CONTAINER_ENV_TMPFILE},OB_EXPORT ${OB_EXPORT})
+
+CONTAINER_ENV_SHA1 := $(call trace-shell,container-env,SHA1=$$(sha1sum <${CONTAINER_ENV_TMPFILE} | cut -c 1-40) && mv -f ${CONTAINER_ENV_TMPFILE} ${CACHE_DIR}/container-$${SHA1}.env && echo $${SHA1})
+CONTAINER_ENV_FILE := ${CACHE_DIR}/container-${CONTAINER_ENV_SHA1}.env
+
+CONTAINER_ENV_ARGS := --env-file ${CONTAINER_ENV_FILE}
 
 # Mount the required volumes if not already done.
 override OB_CONTAINER_VOLUMES += ${OPENBAR_DIR} ${OB_BUILD_DIR}
 
+# Mount the directory of the trace file, so that the events are also recorded
+# from inside the container.
+ifdef OB_TRACE
+  ifneq ($(patsubst %/,%,$(dir ${OB_TRACE})),${OB_ROOT_DIR})
+    override OB_CONTAINER_VOLUMES += $(patsubst %/,%,$(dir ${OB_TRACE}))
+  endif
+endif
+
 # Add OE/Yocto related volumes to the mount list.
 ifeq (${OB_TYPE},yocto)
   override OB_CONTAINER_VOLUMES += ${DEPLOY_DIR} ${DL_DIR} ${SSTATE_DIR}
+
+  ifneq ($(filter-out 0,${OB_YOCTO_HASHSERV} ${OB_YOCTO_PRSERV}),)
+    override OB_CONTAINER_VOLUMES += ${OB_YOCTO_SERVER_DIR}
+  endif
+endif
+
+# Mount a persistent home directory if requested. It is shared by all the
+# containers of the project using the same image, so that the caches (like
+# ~/.cache) and the tools state are kept between the runs. As it is created
+# on the host, it is owned by the current user for both engines.
+ifneq (${OB_CONTAINER_PERSISTENT_HOME},0)
+  CONTAINER_HOME_ID := $(or ${CONTAINER_ID},${CONTAINER_HOSTNAME})
+
+  OB_CONTAINER_HOME_DIR ?= $(or ${XDG_CACHE_HOME},${HOME}/.cache)/openbar/${OB_PROJECT_ID}/${CONTAINER_HOME_ID}/home
+
+  override OB_CONTAINER_VOLUMES += ${OB_CONTAINER_HOME_DIR}:${OB_CONTAINER_HOME}
+endif
+
+# Use a compiler cache if requested. The ccache(1) directory is specific to
+# each container image, as the toolchains may not be compatible. It stays
+# valid when the image is built again, as the compilers are checked using
+# their content. Its size is limited by OB_CCACHE_MAXSIZE, ccache(1) evicting
+# the least recently used files. Its statistics are printed after each run.
+ifdef OB_CCACHE_DIR
+  OB_CCACHE_MAXSIZE ?= 5G
+
+  CONTAINER_CCACHE_DIR := ${OB_CCACHE_DIR}/$(or ${CONTAINER_ID},${CONTAINER_HOSTNAME})
+
+  override OB_CONTAINER_VOLUMES += ${CONTAINER_CCACHE_DIR}
+
+  CONTAINER_ENV_ARGS += -e CCACHE_DIR=${CONTAINER_CCACHE_DIR}
+  CONTAINER_ENV_ARGS += -e CCACHE_MAXSIZE=${OB_CCACHE_MAXSIZE}
+  CONTAINER_ENV_ARGS += -e CCACHE_COMPILERCHECK=content
+  CONTAINER_ENV_ARGS += -e CCACHE_BASEDIR=${OB_ROOT_DIR}
+
+  CONTAINER_CCACHE := ${OPENBAR_DIR}/scripts/container-ccache.sh
 endif
 
 CONTAINER_VOLUME_ARGS :=
@@ -90,6 +172,26 @@ CONTAINER_BUILD_ARGS += --label io.github.openbar.sha1=${CONTAINER_SHA1}
 
 CONTAINER_BUILD_ARGS += ${OB_CONTAINER_BUILD_EXTRA_ARGS}
 
+# Use a build cache directory if requested, so that it can be kept between
+# CI jobs whose container engines start with an empty layer cache. Each image
+# has its own cache, and the least recently built ones are removed to fit in
+# the OB_CONTAINER_CACHE_BUDGET (see scripts/container-cache.sh).
+ifdef OB_CONTAINER_CACHE_DIR
+  ifeq (${CONTAINER_COMMAND},build)
+    OB_CONTAINER_CACHE_BUDGET ?= 0
+
+    CONTAINER_CACHE_ID := ${OB_PROJECT_ID}-${CONTAINER_ID}
+    CONTAINER_CACHE_PATH := ${OB_CONTAINER_CACHE_DIR}/${CONTAINER_CACHE_ID}
+
+    CONTAINER_CACHE := OB_VERBOSE=${OB_VERBOSE} ${OPENBAR_DIR}/scripts/container-cache.sh
+    CONTAINER_CACHE_ARGS := ${OB_CONTAINER_ENGINE} ${OB_CONTAINER_CACHE_DIR}
+    CONTAINER_CACHE_ARGS += ${CONTAINER_CACHE_ID} ${CONTAINER_TAG}
+
+    CONTAINER_CACHE_SAVE := ${CONTAINER_CACHE} save ${CONTAINER_CACHE_ARGS}
+    CONTAINER_CACHE_SAVE += ${OB_CONTAINER_CACHE_BUDGET}
+  endif
+endif
+
 # Container pull default arguments.
 CONTAINER_PULL_ARGS :=
 
@@ -105,41 +207,147 @@ CONTAINER_RUN_ARGS += --privileged		# Allow access to devices.
 # Never pull when running.
 CONTAINER_RUN_ARGS += --pull never
 
+# Container exec default arguments. These arguments are given to the run
+# command, or to the exec command when a session container is used.
+CONTAINER_EXEC_ARGS :=
+
 # Allow to run interactive commands.
-ifeq ($(shell tty >/dev/null && echo interactive),interactive)
-  CONTAINER_RUN_ARGS += --interactive --tty -e TERM=${TERM}
+ifeq ($(call trace-shell,tty,tty >/dev/null && echo interactive),interactive)
+  CONTAINER_EXEC_ARGS += --interactive --tty -e TERM=${TERM}
 endif
 
 # Set the hostname to be identifiable.
 CONTAINER_RUN_ARGS += --hostname ${CONTAINER_HOSTNAME}
 CONTAINER_RUN_ARGS += --add-host ${CONTAINER_HOSTNAME}:127.0.0.1
 
-# Bind the local ssh configuration and authentication.
-ifneq ($(wildcard ${HOME}/.ssh),)
-  CONTAINER_RUN_ARGS += -v ${HOME}/.ssh:${OB_CONTAINER_HOME}/.ssh:ro
+# Bind the local ssh configuration and authentication, and the local netrc
+# file. With a persistent home directory, nothing is mounted inside it, as
+# docker would create root owned mount points in the host directory: it keeps
+# its own files, and the ssh agent socket is mounted outside of it.
+ifeq (${OB_CONTAINER_PERSISTENT_HOME},0)
+  CONTAINER_SSH_SOCKET := ${OB_CONTAINER_HOME}/ssh.socket
+
+  ifneq ($(wildcard ${HOME}/.ssh),)
+    CONTAINER_RUN_ARGS += -v ${HOME}/.ssh:${OB_CONTAINER_HOME}/.ssh:ro
+  endif
+
+  ifneq ($(wildcard ${HOME}/.netrc),)
+    CONTAINER_RUN_ARGS += -v ${HOME}/.netrc:${OB_CONTAINER_HOME}/.netrc:ro
+  endif
+else
+  CONTAINER_SSH_SOCKET := /run/openbar/ssh.socket
 endif
 
 ifdef SSH_AUTH_SOCK
   ifneq ($(wildcard ${SSH_AUTH_SOCK}),)
-    CONTAINER_RUN_ARGS += -v ${SSH_AUTH_SOCK}:${OB_CONTAINER_HOME}/ssh.socket:ro
-    CONTAINER_RUN_ARGS += -e SSH_AUTH_SOCK=${OB_CONTAINER_HOME}/ssh.socket
+    CONTAINER_RUN_ARGS += -v ${SSH_AUTH_SOCK}:${CONTAINER_SSH_SOCKET}:ro
+    CONTAINER_EXEC_ARGS += -e SSH_AUTH_SOCK=${CONTAINER_SSH_SOCKET}
   endif
 endif
 
-# Also bind the local netrc file.
-ifneq ($(wildcard ${HOME}/.netrc),)
-  CONTAINER_RUN_ARGS += -v ${HOME}/.netrc:${OB_CONTAINER_HOME}/.netrc:ro
-endif
-
 # Mount the root directory as working directory.
-CONTAINER_RUN_ARGS += -w ${OB_ROOT_DIR}
+CONTAINER_EXEC_ARGS += -w ${OB_ROOT_DIR}
 CONTAINER_RUN_ARGS += -v ${OB_ROOT_DIR}:${OB_ROOT_DIR}
 
 # Mount the required volumes.
 CONTAINER_RUN_ARGS += ${CONTAINER_VOLUME_ARGS}
 
 # Export the required environment variables.
-CONTAINER_RUN_ARGS += ${CONTAINER_ENV_ARGS}
+CONTAINER_EXEC_ARGS += ${CONTAINER_ENV_ARGS}
+
+# Share the jobserver with the container if requested. A FIFO jobserver is
+# created in the build directory, which is mounted at the same path, and is
+# advertised using the MAKEFLAGS. The recipe is marked as recursive (see
+# container_forward.mk), so that the file descriptors of a pipe jobserver are
+# inherited. A FIFO jobserver requires GNU make 4.4 or later: with an older
+# make inside the container, it is left out and the jobs are used instead.
+ifneq (${OB_CONTAINER_JOBSERVER},0)
+  CONTAINER_JOBSERVER := OB_VERBOSE=${OB_VERBOSE} ${OPENBAR_DIR}/scripts/container-jobserver.sh
+  CONTAINER_JOBSERVER += ${CACHE_DIR}/jobserver
+
+  CONTAINER_MAKEFLAGS := ${OPENBAR_DIR}/scripts/container-makeflags.sh
+
+  CONTAINER_EXEC_ARGS += -e MAKEFLAGS
+endif
+
+# Use a derived image with the user already created if requested.
+#
+# The user image is built from the container image by the .forward target
+# if the container image, the UID, the GID or the OB_DOCKER_GROUPS changed.
+ifneq (${OB_CONTAINER_USER_IMAGE},0)
+  CONTAINER_USER_TAG := localhost/openbar/${OB_PROJECT_ID}/user/${CONTAINER_HOSTNAME}:latest
+
+  CONTAINER_USER_BUILD := OB_VERBOSE=${OB_VERBOSE} ${OPENBAR_DIR}/scripts/container-user.sh
+  CONTAINER_USER_BUILD += ${OB_CONTAINER_ENGINE} ${CONTAINER_TAG} ${CONTAINER_USER_TAG}
+  CONTAINER_USER_BUILD += ${OB_CONTAINER_HOME}
+  CONTAINER_USER_BUILD += --label io.github.openbar.project_id=${OB_PROJECT_ID}
+
+  CONTAINER_RUN_TAG := ${CONTAINER_USER_TAG}
+else
+  CONTAINER_RUN_TAG := ${CONTAINER_TAG}
+endif
+
+# Use a project hash equivalence server if requested.
+#
+# The bitbake-hashserv(1) server runs in a detached sidecar container, using
+# the same image and volumes, and listens on a UNIX socket located in the
+# OB_YOCTO_SERVER_DIR. The sidecar container is identified by the project and
+# this directory. As it is shared by all the configurations using the same
+# directory, whatever their image, a running sidecar is never started again.
+# It is removed by the "containerclean" target.
+ifeq (${OB_TYPE},yocto)
+  ifneq (${OB_YOCTO_HASHSERV},0)
+    CONTAINER_HASHSERV_NAME := openbar-${OB_PROJECT_ID}-hashserv-$(call trace-shell,container-hashserv,printf '%s' ${OB_YOCTO_SERVER_DIR} | sha1sum | cut -c 1-12)
+
+    CONTAINER_HASHSERV_ARGS := ${CONTAINER_RUN_ARGS}
+    CONTAINER_HASHSERV_ARGS += --detach --name ${CONTAINER_HASHSERV_NAME}
+    CONTAINER_HASHSERV_ARGS += --label io.github.openbar.project_id=${OB_PROJECT_ID}
+    CONTAINER_HASHSERV_ARGS += --label io.github.openbar.hashserv=${OB_YOCTO_SERVER_DIR}
+    CONTAINER_HASHSERV_ARGS += -e OB_VERBOSE=${OB_VERBOSE}
+
+    CONTAINER_HASHSERV_SCRIPT := ${OPENBAR_DIR}/scripts/yocto-hashserv.sh
+
+    # The CONTAINER_HASHSERV_RUN command is set by the container engine layer.
+    CONTAINER_HASHSERV_START = OB_VERBOSE=${OB_VERBOSE} ${CONTAINER_HASHSERV_SCRIPT} start
+    CONTAINER_HASHSERV_START += ${OB_CONTAINER_ENGINE} ${CONTAINER_HASHSERV_NAME}
+    CONTAINER_HASHSERV_START += ${OB_YOCTO_SERVER_DIR}/hashserv.sock
+    CONTAINER_HASHSERV_START += ${CONTAINER_HASHSERV_RUN}
+    CONTAINER_HASHSERV_START += ${CONTAINER_HASHSERV_SCRIPT} serve
+    CONTAINER_HASHSERV_START += ${OB_INITENV_SCRIPT} ${OB_YOCTO_SERVER_DIR}
+  endif
+endif
+
+# Use a long-lived session container if requested.
+#
+# The session container is started once, detached, and the forwarded commands
+# are executed inside it. It is identified by the project, the image and the
+# run arguments (like the mounted volumes), so a new session is started if any
+# of them changes.
+#
+# The session container is removed when it has been idle for
+# OB_CONTAINER_SESSION_TIMEOUT seconds, when its image is built or pulled, and
+# by the "containerclean" target.
+ifneq (${OB_CONTAINER_SESSION},0)
+  CONTAINER_SESSION_KEY := ${OB_CONTAINER_ENGINE} ${CONTAINER_RUN_TAG} ${CONTAINER_SHA1}
+  CONTAINER_SESSION_KEY += ${CONTAINER_RUN_ARGS} ${OB_CONTAINER_RUN_EXTRA_ARGS}
+  CONTAINER_SESSION_KEY += ${OB_DOCKER_RUN_EXTRA_ARGS} ${OB_DOCKER_GROUPS}
+  CONTAINER_SESSION_KEY += ${OB_PODMAN_RUN_EXTRA_ARGS}
+
+  CONTAINER_SESSION_NAME := openbar-${OB_PROJECT_ID}-$(call trace-shell,container-session,printf '%s' $(call shell-quote,${CONTAINER_SESSION_KEY}) | sha1sum | cut -c 1-12)
+
+  CONTAINER_SESSION_SCRIPT := ${OPENBAR_DIR}/scripts/container-session.sh
+
+  CONTAINER_SESSION_START := ${CONTAINER_SESSION_SCRIPT} start ${OB_CONTAINER_ENGINE} ${CONTAINER_SESSION_NAME}
+  CONTAINER_SESSION_IDLE := ${CONTAINER_SESSION_SCRIPT} idle ${OB_CONTAINER_SESSION_TIMEOUT}
+  CONTAINER_SESSION_EXEC := ${CONTAINER_SESSION_SCRIPT} exec
+  CONTAINER_SESSION_STOP := ${OB_CONTAINER_ENGINE} rm -f ${CONTAINER_SESSION_NAME} >/dev/null 2>&1 || true
+
+  CONTAINER_RUN_ARGS += --detach --name ${CONTAINER_SESSION_NAME}
+  CONTAINER_RUN_ARGS += --label io.github.openbar.project_id=${OB_PROJECT_ID}
+  CONTAINER_RUN_ARGS += --label io.github.openbar.session=${CONTAINER_TAG}
+else
+  CONTAINER_RUN_ARGS += ${CONTAINER_EXEC_ARGS}
+endif
 
 # Add optional extra arguments.
 CONTAINER_RUN_ARGS += ${OB_CONTAINER_RUN_EXTRA_ARGS}
@@ -7,46 +7,90 @@ else
   NEXT_LAYER := type/initenv.mk
 endif
 
+$(call trace-recipe,.forward,core/${NEXT_LAYER},layer)
+$(call trace-recipe,.container-build,container-build,container)
+$(call trace-recipe,.container-pull,container-pull,container)
+
 .PHONY: .forward
 .forward: | ${CONTAINER_VOLUME_HOSTDIRS}
-	${CONTAINER_RUN} $(call submake_noenv,${NEXT_LAYER})
+ifdef CONTAINER_USER_TAG
+	${CONTAINER_USER_BUILD}
+endif
+ifdef CONTAINER_HASHSERV_NAME
+	${CONTAINER_HASHSERV_START}
+endif
+ifdef CONTAINER_JOBSERVER
+	+${CONTAINER_JOBSERVER} sh -c $(call shell-quote,${CONTAINER_RUN} ${CONTAINER_CCACHE} ${CONTAINER_MAKEFLAGS} $(call submake_nojobs,${NEXT_LAYER}))
+else
+	${CONTAINER_RUN} ${CONTAINER_CCACHE} $(call submake_noenv,${NEXT_LAYER})
+endif
 
 .PHONY: .container-build
 .container-build:
 	@echo "Building ${OB_CONTAINER_ENGINE} image '${CONTAINER_TAG:localhost/%=%}'"
+ifdef CONTAINER_CACHE_LOAD
+	${CONTAINER_CACHE_LOAD} || ${QUIET} ${CONTAINER_BUILD}
+else
 	${QUIET} ${CONTAINER_BUILD}
+endif
+	rm -f ${CONTAINER_STATUS_STAMP}
+ifdef CONTAINER_CACHE_SAVE
+	${CONTAINER_CACHE_SAVE}
+endif
+ifneq ($(filter-out 0,${OB_CONTAINER_GC}),)
+	${CONTAINER_GC}
+endif
+ifdef CONTAINER_SESSION_NAME
+	${CONTAINER_SESSION_STOP}
+endif
 
 .PHONY: .container-pull
 .container-pull:
 	@echo "Pulling ${OB_CONTAINER_ENGINE} image '${CONTAINER_TAG}'"
 	${QUIET} ${CONTAINER_PULL}
+	rm -f ${CONTAINER_STATUS_STAMP}
+ifdef CONTAINER_SESSION_NAME
+	${CONTAINER_SESSION_STOP}
+endif
+
+# The internal targets used by the "containers" target of the main layer, to
+# get the image tag and to build or pull the image without running it.
+.PHONY: .container-tag
+.container-tag:
+	@echo ${CONTAINER_TAG}
+
+.PHONY: .container
+.container:
+ifdef CONTAINER_USER_TAG
+	${CONTAINER_USER_BUILD}
+endif
 
 ifeq (${CONTAINER_COMMAND},pull)
   ifdef OB_CONTAINER_FORCE_PULL
     ifneq (${OB_CONTAINER_FORCE_PULL},0)
-      .forward: .container-pull
+      .forward .container: .container-pull
     endif
   else ifeq ($(filter-out missing newer,${OB_CONTAINER_POLICY}),)
     ifeq ($(call container-status,missing newer),)
-      .forward: .container-pull
+      .forward .container: .container-pull
     endif
   else ifneq (${OB_CONTAINER_POLICY},never)
-    .forward: .container-pull
+    .forward .container: .container-pull
   endif
 else
   ifdef OB_CONTAINER_FORCE_BUILD
     ifneq (${OB_CONTAINER_FORCE_BUILD},0)
-      .forward: .container-build
+      .forward .container: .container-build
     endif
   else ifeq (${OB_CONTAINER_POLICY},newer)
-    ifeq ($(call container-status,missing newer,${OB_CONTAINER_FILE}),)
-      .forward: .container-build
+    ifeq ($(call container-status,missing newer,${CONTAINER_SHA1}),)
+      .forward .container: .container-build
     endif
   else ifeq (${OB_CONTAINER_POLICY},missing)
-    ifeq ($(call container-status,missing,${OB_CONTAINER_FILE}),)
-      .forward: .container-build
+    ifeq ($(call container-status,missing,${CONTAINER_SHA1}),)
+      .forward .container: .container-build
     endif
   else ifneq (${OB_CONTAINER_POLICY},never)
-    .forward: .container-build
+    .forward .container: .container-build
   endif
 endif
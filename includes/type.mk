@@ -2,3 +2,11 @@
 ifeq (${OB_TYPE},yocto)
   export SHELL := /bin/bash
 endif
+
+# The bitbake layers configuration is done incrementally. A stamp records the
+# configured OB_YOCTO_LAYERS (see scripts/yocto-layers.sh).
+ifeq (${OB_TYPE},yocto)
+  YOCTO_LAYERS := OB_VERBOSE=${OB_VERBOSE} ${OPENBAR_DIR}/scripts/yocto-layers.sh
+  YOCTO_LAYERS_ARGS = ${CACHE_DIR}/bblayers.stamp ${OB_BUILD_DIR}/conf/bblayers.conf
+  YOCTO_LAYERS_ARGS += $(strip ${OB_YOCTO_LAYERS})
+endif
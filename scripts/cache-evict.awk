@@ -0,0 +1,105 @@
+# Select the least recently used entries of a cache directory.
+#
+# With GROUP set, the input is the list of files, one per line, formatted as:
+#   <atime>\t<mtime>\t<size>\t<path>
+# and the entries are printed as:
+#   <time>\t<size>\t<path>
+# where the <time> is the most recent access or modification time of their
+# files. An entry groups a file with its companion files (like the ".done"
+# stamps of the downloads, or the ".siginfo" files of the shared state), or a
+# whole repository directory (like the bare git mirrors of the downloads).
+#
+# Otherwise, the input is the list of entries sorted by time, and the entries
+# to remove are listed until the total size fits in the budget. A summary is
+# printed.
+#
+# The following variables are used:
+# - BUDGET: the size budget, with an optional K, M, G or T suffix.
+# - KEEP: the entries accessed since this time are never removed.
+# - DIRECTORY: the cache directory, used in the summary.
+# - LIST: the file listing the entries to remove.
+
+BEGIN				{ FS = "\t"; OFS = "\t" }
+
+## size_parse <string>
+# Convert a size with an optional binary unit suffix into bytes.
+function size_parse(string,    unit) {
+	unit = toupper(string);
+	sub(/^[0-9.]+/, "", unit);
+	sub(/I?B$/, "", unit);
+
+	return (string + 0) * 1024 ^ (unit == "" ? 0 : index("KMGT", unit));
+}
+
+## size_format <bytes>
+# Convert bytes into a human readable size.
+function size_format(bytes,    units, i) {
+	units = "BKMGT";
+
+	for (i = 1; bytes >= 1024 && i < length(units); i++) {
+		bytes /= 1024;
+	}
+
+	return sprintf(i == 1 ? "%d%s" : "%.1f%siB", bytes, substr(units, i, 1));
+}
+
+## entry <path>
+# Get the entry of a file path.
+function entry(path,    i) {
+	# The version control repositories are removed as a whole.
+	if (match(path, /^(bzr|cvs|git2|gitsm|hg|repo|svn)\/[^\/]+\//)) {
+		return substr(path, 1, RLENGTH - 1);
+	}
+
+	i = index(path, ".git/");
+
+	if (i > 0) {
+		return substr(path, 1, i + 3);
+	}
+
+	sub(/\.(done|lock|sig|siginfo)$/, "", path);
+
+	return path;
+}
+
+GROUP {
+	key = entry($4);
+	time = $1 > $2 ? $1 : $2;
+
+	if (!(key in sizes) || time > atimes[key]) {
+		atimes[key] = time;
+	}
+
+	sizes[key] += $3;
+	next;
+}
+
+{
+	atimes[NR] = $1;
+	sizes[NR] = $2;
+	keys[NR] = $3;
+	total += $2;
+}
+
+END {
+	if (GROUP) {
+		for (key in sizes) {
+			print atimes[key], sizes[key], key;
+		}
+
+		exit;
+	}
+
+	budget = size_parse(BUDGET);
+	used = total;
+
+	for (i = 1; i <= NR && used > budget && atimes[i] < KEEP; i++) {
+		print keys[i] > LIST;
+		used -= sizes[i];
+		removed++;
+	}
+
+	printf "%s: removed %d entries (%s), %s used for a budget of %s\n",
+		DIRECTORY, removed, size_format(total - used),
+		size_format(used), size_format(budget);
+}
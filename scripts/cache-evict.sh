@@ -0,0 +1,68 @@
+#!/bin/sh
+# shellcheck shell=sh enable=all
+
+# Usage: cache-evict.sh <stamp> [<budget> <directory>]...
+#
+# Remove the least recently used entries of each cache <directory> until its
+# size fits in its <budget>, and report what was reclaimed. A <budget> of 0
+# disables the eviction of its <directory>.
+#
+# The modification time of the <stamp> is the start of the last build. The
+# entries accessed since then are never removed. As the relatime mount option
+# only updates the access time once a day, this includes the previous day.
+#
+# The modification time of an entry is also used when it is more recent than
+# its access time. On a noatime mount, where the access time is never updated,
+# the entries are then ordered by their last modification, which bitbake
+# updates when it reuses a shared state archive, but not a download.
+
+if [ "${OB_VERBOSE:-0}" = 1 ]; then
+	set -x
+fi
+
+STAMP=$1
+shift
+
+if [ -f "${STAMP}" ]; then
+	KEEP=$(stat -c %Y "${STAMP}")
+	KEEP=$((KEEP - 86400))
+else
+	KEEP=
+fi
+
+AWK_SCRIPT=$(dirname "$0")/cache-evict.awk
+
+TMPDIR=$(mktemp -d)
+trap 'rm -rf "${TMPDIR}"' EXIT
+
+while [ $# -ge 2 ]; do
+	BUDGET=$1
+	DIRECTORY=$2
+	shift 2
+
+	if [ -z "${BUDGET}" ] || [ "${BUDGET}" = 0 ] || [ ! -d "${DIRECTORY}" ]; then
+		continue
+	fi
+
+	find "${DIRECTORY}" -type f -printf '%A@\t%T@\t%s\t%P\n' >"${TMPDIR}/files" || exit 1
+
+	awk -v GROUP=1 -f "${AWK_SCRIPT}" <"${TMPDIR}/files" \
+		| sort -n -t "$(printf '\t')" -k 1,1 >"${TMPDIR}/entries" || exit 1
+
+	: >"${TMPDIR}/remove"
+
+	awk -v BUDGET="${BUDGET}" -v KEEP="${KEEP:-9e99}" \
+		-v DIRECTORY="${DIRECTORY}" -v LIST="${TMPDIR}/remove" \
+		-f "${AWK_SCRIPT}" <"${TMPDIR}/entries" || exit 1
+
+	(
+		cd "${DIRECTORY}" || exit 1
+
+		while IFS= read -r ENTRY; do
+			rm -rf -- "${ENTRY}" "${ENTRY}.done" "${ENTRY}.lock" \
+				"${ENTRY}.sig" "${ENTRY}.siginfo"
+		done
+	) <"${TMPDIR}/remove" || exit 1
+
+	find "${DIRECTORY}" -mindepth 1 -type d -empty -delete
+done
@@ -0,0 +1,71 @@
+#!/bin/sh
+# shellcheck shell=sh enable=all
+
+# Usage: config-cache.sh <directory> <command file> <env file> <filter> [args...]
+#
+# Run the shell command stored in the <command file> and pipe its output
+# through the <filter>. The filtered output is cached in the <directory>.
+#
+# The cache entry is keyed by the command, the <env file> it reads its
+# variables from, the environment it inherits (without the variables set by
+# make(1) or the shell, and the trace variables, which change at each call) and
+# the filter, including the content of the files given to it (like its script).
+# It is reused as long as none of the makefiles read by the command (listed in
+# the MAKEFILE_LIST variable of the printed database) have changed.
+#
+# The values computed by the $(shell) function of the command are cached too:
+# they are not computed again until the cache entry is invalidated.
+
+if [ "${OB_VERBOSE:-0}" = 1 ]; then
+	set -x
+fi
+
+DIRECTORY=$1
+COMMAND=$2
+ENV_FILE=$3
+shift 3
+
+ID=$({
+	cat "${COMMAND}" "${ENV_FILE}"
+	echo "$@"
+
+	env | grep -v -E "^(MAKEFLAGS|MFLAGS|MAKELEVEL|MAKE_TERM[A-Z]*|OB_TRACE[A-Z_]*|OLDPWD|PWD|SHLVL|_)=" | LC_ALL=C sort
+
+	for ARG in "$@"; do
+		if [ -f "${ARG}" ]; then
+			cat "${ARG}"
+		fi
+	done
+} | sha1sum | cut -d " " -f 1)
+
+ENTRY=${DIRECTORY}/${ID}
+
+if [ -f "${ENTRY}.output" ] && sha1sum --check --status "${ENTRY}.sha1" 2>/dev/null; then
+	exec cat "${ENTRY}.output"
+fi
+
+DATABASE=$(mktemp)
+trap 'rm -f "${DATABASE}" "${ENTRY}.output.$$" "${ENTRY}.sha1.$$"' EXIT
+
+sh "${COMMAND}" >"${DATABASE}"
+STATUS=$?
+
+# A status of 2 means that make(1) encountered an error: nothing is cached.
+if [ "${STATUS}" -ge 2 ]; then
+	rm -f "${ENTRY}.output" "${ENTRY}.sha1"
+	"$@" <"${DATABASE}"
+	exit
+fi
+
+MAKEFILES=$(sed -n 's/^MAKEFILE_LIST :=[[:space:]]*//p' "${DATABASE}")
+
+"$@" <"${DATABASE}" >"${ENTRY}.output.$$"
+
+# shellcheck disable=SC2086
+if [ -n "${MAKEFILES}" ] && sha1sum ${MAKEFILES} >"${ENTRY}.sha1.$$"; then
+	mv -f "${ENTRY}.output.$$" "${ENTRY}.output"
+	mv -f "${ENTRY}.sha1.$$" "${ENTRY}.sha1"
+	cat "${ENTRY}.output"
+else
+	cat "${ENTRY}.output.$$"
+fi
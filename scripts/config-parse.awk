@@ -0,0 +1,155 @@
+# Parse the database printed by make(1) for the configuration file.
+#
+# The output is selected using the following variables:
+# - VARIABLES: print the variables, the OB_ALL_TARGETS list and the
+#   config-makefiles list (the makefiles read by the configuration).
+# - TARGETS: print the targets with their recipes.
+# - OVERRIDE: also print the overridden variables with their directive.
+#
+# The variables overridden by the ENV_FILE makefile, which gives the exported
+# variables of the calling layer, are not part of the configuration.
+
+# Use a special output separator to let make(1) evaluate the output
+# as the new line characters are substituted.
+BEGIN				{ ORS = "\v" }
+
+# Remove the separators between the printed strings and manage the spacing
+# manually.
+BEGIN				{ OFS = "" }
+
+# Use colon as field separator to extract the names.
+BEGIN				{ FS = ":| " }
+
+# Special variables are ignored.
+BEGIN {
+	split(".DEFAULT_GOAL .EXTRA_PREREQS .FEATURES .INCLUDE_DIRS" \
+	      " .LIBPATTERNS .LOADED .RECIPEPREFIX .SHELLFLAGS .VARIABLES" \
+	      " COMSPEC CURDIR DESTDIR GNUMAKEFLAGS GPATH MAKE MAKECMDGOALS" \
+	      " MAKEFILES MAKEFILE_LIST MAKEFLAGS MAKELEVEL MAKEOVERRIDES" \
+	      " MAKESHELL MAKE_COMMAND MAKE_HOST MAKE_RESTARTS MAKE_TERMERR" \
+	      " MAKE_TERMOUT MAKE_VERSION MFLAGS OUTPUT_OPTION SHELL SUFFIXES" \
+	      " VPATH", names, " ");
+
+	for (i in names) {
+		special_variables[names[i]] = 1;
+	}
+}
+
+# Special and internal targets are ignored.
+BEGIN {
+	split(".PHONY .SUFFIXES .DEFAULT .PRECIOUS .INTERMEDIATE .SECONDARY" \
+	      " .SECONDEXPANSION .DELETE_ON_ERROR .IGNORE .LOW_RESOLUTION_TIME" \
+	      " .SILENT .EXPORT_ALL_VARIABLES .NOTPARALLEL .ONESHELL .POSIX" \
+	      " foreach help shell", names, " ");
+
+	for (i in names) {
+		special_targets[names[i]] = 1;
+	}
+}
+
+# Handle makefile errors.
+/\*\*\*.*Stop\.$/		{ error = $0;
+				  sub(/.*\*\*\*[[:space:]]+/, "", error);
+				  sub(/\.[[:space:]]+Stop\.$/, "", error);
+				  exit; }
+
+# Handle multi-line variables.
+/^define /			{ multiline = 1 }
+/^endef$/			{ multiline = 0 }
+
+# The makefiles read by the configuration are saved.
+/^MAKEFILE_LIST :=/		{ if (multiline == 0) {
+					makefiles = $0;
+					sub(/^MAKEFILE_LIST :=[[:space:]]*/, "", makefiles);
+				  } }
+
+# Variables are defined in a dedicated section surrounded by blank lines.
+/^#[[:space:]]+Variables$/	{ variable_section = 2 }
+/^$/				{ if (multiline == 0) variable_section-- }
+
+# Only explicit variables are valid.
+/^#[[:space:]]+makefile \(from '[[:print:]]+', line [[:digit:]]+\)$/ \
+				{ variable = 1 }
+
+# Also allow overridden variables, except the ones of the ENV_FILE.
+/^#[[:space:]]+'override' directive \(from '[[:print:]]+', line [[:digit:]]+\)$/ \
+				{ if (!ENV_FILE || !index($0, "(from '" ENV_FILE "',")) {
+					variable = 1; override = 1;
+				  } }
+
+# Explicit targets are defined in the Files section.
+/^#[[:space:]]+Files$/		{ target_section = 1 }
+
+# Not a target blocks are ignored.
+/^#[[:space:]]+Not a target:$/	{ notatarget = 1 }
+/^$/				{ notatarget = 0 }
+
+# Comments and blank lines are skipped.
+/^#/ || /^$/			{ if (multiline == 0) next }
+
+# Recipes are printed along with their targets.
+/^\t/				{ if (multiline == 0) {
+					if (TARGETS && target_section > 0 && !notatarget)
+						print;
+					next;
+				  } }
+
+# Remaining variables are printed.
+variable_section > 0 {
+	if (multiline == 0 && $1 in special_variables) {
+		variable = 0;
+	}
+
+	if (override) {
+		override = 0;
+
+		if (VARIABLES) {
+			print "override OB_EXPORT += " $1;
+
+			if (OVERRIDE) {
+				print "override " $0;
+				print "export " $1;
+			}
+		}
+
+	} else if (variable && VARIABLES) {
+		print;
+	}
+
+	# The next variable must be validated again.
+	if (multiline == 0) variable = 0;
+}
+
+# Remaining targets are printed and saved.
+target_section > 0 {
+	if ($1 in special_targets || $1 ~ /_defconfig$/) {
+		notatarget = 1;
+	}
+
+	if (!notatarget) {
+		if (TARGETS) print;
+		targets[$1]++;
+	}
+}
+
+# The saved targets are printed in a dedicated variable if no errors where
+# detected.
+END {
+	if (error) {
+		print "ifdef CONFIG_IGNORE_ERROR";
+		print "  CONFIG_ERROR := ", error;
+		print "else"
+		print "  $(error .config: ", error, ")";
+		print "endif";
+
+	} else if (VARIABLES) {
+		printf "OB_ALL_TARGETS := ";
+
+		for (target in targets) {
+			printf " %s", target;
+		}
+
+		print "";
+		print "config-makefiles := ", makefiles;
+	}
+}
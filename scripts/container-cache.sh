@@ -0,0 +1,120 @@
+#!/bin/sh
+# shellcheck shell=sh enable=all
+
+# Manage the container build cache directory. Each image has its own cache
+# in the <directory>, named by its <id>.
+#
+# Usage: container-cache.sh load <engine> <directory> <id> <tag> <sha1>
+#   Load the image saved in the cache. Succeed if it is the same as the image
+#   to build, using its <sha1> label, so that the build can be skipped.
+#
+# Usage: container-cache.sh save <engine> <directory> <id> <tag> <budget>
+#   Save the cache of the built image. Then remove the least recently saved
+#   caches of the other images until the <directory> fits in the <budget>
+#   (with an optional K, M, G or T suffix, 0 to disable).
+#
+# With docker, the BuildKit layer cache is exported by the build itself into
+# a new directory, which then replaces the previous one to drop the unused
+# layers. With podman, the built image is saved as an OCI archive.
+
+if [ "${OB_VERBOSE:-0}" = 1 ]; then
+	set -x
+fi
+
+COMMAND=$1
+ENGINE=$2
+DIRECTORY=$3
+ID=$4
+TAG=$5
+
+CACHE=${DIRECTORY}/${ID}
+
+## image_id
+# Print the ID of the image.
+image_id() {
+	"${ENGINE}" image inspect --format "{{.Id}}" "${TAG}" 2>/dev/null
+}
+
+## prune <budget>
+prune() {
+	BUDGET=$(numfmt --from=iec "$1") || return 1
+	TOTAL=0
+
+	if [ "${BUDGET}" = 0 ]; then
+		return 0
+	fi
+
+	find "${DIRECTORY}" -mindepth 1 -maxdepth 1 -type d ! -name "*.new" \
+		-printf '%T@\t%f\n' | sort -rn | cut -f 2 >"${CACHE}.list"
+
+	while IFS= read -r NAME; do
+		SIZE=$(du -sb "${DIRECTORY}/${NAME}")
+		SIZE=${SIZE%%[[:space:]]*}
+		TOTAL=$((TOTAL + SIZE))
+
+		if [ "${NAME}" != "${ID}" ] && [ "${TOTAL}" -gt "${BUDGET}" ]; then
+			echo "Removing the build cache of ${NAME}"
+			rm -rf "${DIRECTORY:?}/${NAME}"
+			TOTAL=$((TOTAL - SIZE))
+		fi
+	done <"${CACHE}.list"
+
+	rm -f "${CACHE}.list"
+}
+
+case "${COMMAND}" in
+load)
+	SHA1=$6
+
+	if [ "${ENGINE}" != podman ] || [ ! -f "${CACHE}/image.tar" ]; then
+		exit 1
+	fi
+
+	"${ENGINE}" load --quiet --input "${CACHE}/image.tar" >/dev/null || exit 1
+
+	LABEL=$("${ENGINE}" image inspect \
+		--format '{{index .Labels "io.github.openbar.sha1"}}' "${TAG}")
+
+	[ "${LABEL}" = "${SHA1}" ]
+	;;
+
+save)
+	BUDGET=$6
+
+	set -e
+
+	if [ "${ENGINE}" = podman ]; then
+		IMAGE_ID=$(image_id)
+
+		if [ -f "${CACHE}/image.id" ]; then
+			read -r SAVED_ID <"${CACHE}/image.id"
+		else
+			SAVED_ID=
+		fi
+
+		if [ "${IMAGE_ID}" != "${SAVED_ID}" ]; then
+			rm -rf "${CACHE}.new"
+			mkdir -p "${CACHE}.new"
+			"${ENGINE}" save --quiet --format oci-archive \
+				--output "${CACHE}.new/image.tar" "${TAG}"
+			echo "${IMAGE_ID}" >"${CACHE}.new/image.id"
+		fi
+	fi
+
+	if [ -d "${CACHE}.new" ]; then
+		rm -rf "${CACHE}"
+		mv "${CACHE}.new" "${CACHE}"
+	fi
+
+	if [ -d "${CACHE}" ]; then
+		touch "${CACHE}"
+	fi
+
+	prune "${BUDGET}"
+	;;
+
+*)
+	echo >&2 "Invalid command: ${COMMAND}"
+	exit 1
+	;;
+esac
@@ -0,0 +1,24 @@
+#!/bin/sh
+# shellcheck shell=sh enable=all
+
+# Usage: container-ccache.sh <command...>
+#
+# Run the <command> inside the container and print the ccache(1) statistics
+# of this run. Nothing more is done if ccache(1) is not available.
+
+if [ "${OB_VERBOSE:-0}" = 1 ]; then
+	set -x
+fi
+
+if ! command -v ccache >/dev/null; then
+	exec "$@"
+fi
+
+ccache --zero-stats >/dev/null
+
+"$@"
+STATUS=$?
+
+ccache --show-stats
+
+exit "${STATUS}"
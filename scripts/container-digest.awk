@@ -0,0 +1,127 @@
+# Select the files of a container build context and print their sha1.
+#
+# The input is the list of files, one per line, formatted as:
+#   <path>\t<mtime>\t<size>
+#
+# The following variables are used:
+# - CONTEXT: the build context directory.
+# - IGNORE: the ignore file (.containerignore or .dockerignore) if any.
+# - MANIFEST: the manifest file, which is read.
+# - OUTPUT: the updated manifest file, which is written.
+# - LIST: a temporary file used to list the files to hash.
+#
+# The manifest saves the sha1 of each file along with its mtime and size. A
+# file is hashed again only if its mtime or its size has changed.
+
+BEGIN				{ FS = "\t" }
+
+## quote <string>
+# Quote a string to be used as a single shell argument.
+function quote(string) {
+	gsub(/'/, "'\\''", string);
+	return "'" string "'";
+}
+
+## pattern_regex <pattern>
+# Convert an ignore file pattern into an extended regular expression.
+function pattern_regex(pattern,    regex, c, i) {
+	regex = "";
+
+	for (i = 1; i <= length(pattern); i++) {
+		c = substr(pattern, i, 1);
+
+		if (c == "*" && substr(pattern, i + 1, 1) == "*") {
+			regex = regex ".*";
+			i++;
+		} else if (c == "*") {
+			regex = regex "[^/]*";
+		} else if (c == "?") {
+			regex = regex "[^/]";
+		} else if (c == "[") {
+			regex = regex c;
+		} else if (c == "\\" && i < length(pattern)) {
+			regex = regex "[" substr(pattern, ++i, 1) "]";
+		} else if (index(".+()^$|{}", c)) {
+			regex = regex "[" c "]";
+		} else {
+			regex = regex c;
+		}
+	}
+
+	# A matching directory also ignores all its content.
+	return "^" regex "(/.*)?$";
+}
+
+# Read the ignore file.
+BEGIN {
+	while (IGNORE && (getline line < IGNORE) > 0) {
+		gsub(/^[[:space:]]+|[[:space:]]+$/, "", line);
+
+		if (line == "" || line ~ /^#/) {
+			continue;
+		}
+
+		exception = sub(/^!/, "", line);
+		sub(/^(\.?\/)+/, "", line);
+		sub(/\/+$/, "", line);
+
+		patterns++;
+		regexes[patterns] = pattern_regex(line);
+		exceptions[patterns] = exception;
+	}
+}
+
+# Read the previous manifest.
+BEGIN {
+	while ((getline line < MANIFEST) > 0) {
+		split(line, fields, "\t");
+		known[fields[1]] = fields[2] "\t" fields[3];
+		sums[fields[1]] = fields[4];
+	}
+
+	close(MANIFEST);
+}
+
+# The last matching pattern decides if a file is ignored.
+{
+	ignored = 0;
+
+	for (i = 1; i <= patterns; i++) {
+		if ($1 ~ regexes[i]) {
+			ignored = !exceptions[i];
+		}
+	}
+
+	if (ignored) {
+		next;
+	}
+
+	files[$1] = $2 "\t" $3;
+
+	if (known[$1] != files[$1]) {
+		print $1 > LIST;
+		changed++;
+	}
+}
+
+# Hash the new and modified files in a single command.
+END {
+	if (changed) {
+		close(LIST);
+
+		command = "cd " quote(CONTEXT) " && xargs -d '\\n' sha1sum <" quote(LIST);
+
+		while ((command | getline line) > 0) {
+			sums[substr(line, 43)] = substr(line, 1, 40);
+		}
+
+		if (close(command) != 0) {
+			exit 1;
+		}
+	}
+
+	for (file in files) {
+		print file "\t" files[file] "\t" sums[file] > OUTPUT;
+		print sums[file] "  " file;
+	}
+}
@@ -0,0 +1,54 @@
+#!/bin/sh
+# shellcheck shell=sh enable=all
+
+# Usage: container-digest.sh <context> <file> <manifest>
+#
+# Print the digest of a container build: the sha1 of the container <file>
+# and of every file of the build <context> which is not excluded by its
+# .containerignore or .dockerignore file.
+#
+# The sha1 of each file is saved in the <manifest>, indexed by its mtime and
+# size. So only the new and modified files are hashed again.
+
+if [ "${OB_VERBOSE:-0}" = 1 ]; then
+	set -x
+fi
+
+CONTEXT=$1
+FILE=$2
+MANIFEST=$3
+
+if [ ! -d "${CONTEXT}" ] || [ ! -f "${FILE}" ]; then
+	exit 1
+fi
+
+if [ -f "${CONTEXT}/.containerignore" ]; then
+	IGNORE=${CONTEXT}/.containerignore
+elif [ -f "${CONTEXT}/.dockerignore" ]; then
+	IGNORE=${CONTEXT}/.dockerignore
+else
+	IGNORE=
+fi
+
+mkdir -p "$(dirname "${MANIFEST}")"
+
+# The manifest is updated using a temporary file of its own, as other make(1)
+# instances may compute the same digest concurrently.
+TMPDIR=$(mktemp -d)
+NEW_MANIFEST=$(mktemp "${MANIFEST}.XXXXXX") || exit 1
+trap 'rm -rf "${TMPDIR}" "${NEW_MANIFEST}"' EXIT
+
+find "${CONTEXT}" -type f -printf '%P\t%T@\t%s\n' >"${TMPDIR}/files" || exit 1
+
+awk -v CONTEXT="${CONTEXT}" -v IGNORE="${IGNORE}" \
+	-v MANIFEST="${MANIFEST}" -v OUTPUT="${NEW_MANIFEST}" \
+	-v LIST="${TMPDIR}/list" \
+	-f "$(dirname "$0")/container-digest.awk" \
+	<"${TMPDIR}/files" >"${TMPDIR}/sums" || exit 1
+
+mv "${NEW_MANIFEST}" "${MANIFEST}"
+
+{
+	sha1sum <"${FILE}"
+	LC_ALL=C sort "${TMPDIR}/sums"
+} | sha1sum | cut -d " " -f 1
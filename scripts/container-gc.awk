@@ -0,0 +1,76 @@
+# Select the project images to remove.
+#
+# The input is the list of the project images, one per line, formatted as:
+#   <container id>\t<created>\t<size>\t<tags>\t<image id>
+#
+# With CREATED set, the images are printed using the same format, with their
+# <created> time converted to be sorted as a string: the engines print it
+# with a variable number of fractional digits.
+#
+# Otherwise, the images are sorted from the most recent, and the images to
+# remove are printed, one per line, formatted as:
+#   <action>\t<size>\t<image id>
+# The "remove" images must be removed. Then a "total" line gives the total
+# size of the images. Then the "budget" images, from the least recent, are
+# to be removed as long as the remaining size does not fit in the budget.
+#
+# The following variables are used:
+# - KEEP: the number of images to keep for each container ID.
+#
+# The tagged images are always kept, and count as kept images. The other
+# kept images are the budget candidates. Note that the size of an image
+# includes its shared layers.
+
+BEGIN				{ FS = "\t"; OFS = "\t" }
+
+## created_key <created>
+# Convert a creation time (like "2024-01-02T03:04:05.12Z" or "2024-01-02
+# 03:04:05.123456789 +0000 UTC") into a sortable string.
+function created_key(created,    date, fraction) {
+	date = substr(created, 1, 19);
+	gsub(/[^0-9]/, "", date);
+
+	fraction = substr(created, 20);
+
+	if (fraction ~ /^\.[0-9]/) {
+		sub(/^\./, "", fraction);
+		sub(/[^0-9].*$/, "", fraction);
+	} else {
+		fraction = "";
+	}
+
+	return date "." substr(fraction "000000000", 1, 9);
+}
+
+CREATED {
+	$2 = created_key($2);
+	print;
+	next;
+}
+
+{
+	count[$1]++;
+	total += $3;
+
+	if ($4 > 0) {
+		next;
+	} else if (count[$1] <= KEEP) {
+		candidates++;
+		sizes[candidates] = $3;
+		ids[candidates] = $5;
+	} else {
+		print "remove", $3, $5;
+	}
+}
+
+END {
+	if (CREATED) {
+		exit;
+	}
+
+	print "total", total + 0, "";
+
+	for (i = candidates; i > 0; i--) {
+		print "budget", sizes[i], ids[i];
+	}
+}
@@ -0,0 +1,76 @@
+#!/bin/sh
+# shellcheck shell=sh enable=all
+
+# Usage: container-gc.sh <engine> <project id> <keep> <budget>
+#
+# Remove the old images of the project. For each container ID, the <keep>
+# most recent images are kept, along with all the tagged ones. Then the
+# least recent images are removed until their total size fits in the
+# <budget> (with an optional K, M, G or T suffix, 0 to disable).
+#
+# The images used by a container are not removed: the engine reports them,
+# and the next images are removed instead to fit in the <budget>.
+
+if [ "${OB_VERBOSE:-0}" = 1 ]; then
+	set -x
+fi
+
+ENGINE=$1
+PROJECT_ID=$2
+KEEP=$3
+BUDGET=$(numfmt --from=iec "$4") || exit 1
+
+IDS=$("${ENGINE}" images --quiet --no-trunc \
+	--filter "label=io.github.openbar.project_id=${PROJECT_ID}" | sort -u)
+
+if [ -z "${IDS}" ]; then
+	exit 0
+fi
+
+TMPDIR=$(mktemp -d)
+trap 'rm -rf "${TMPDIR}"' EXIT
+
+FORMAT='{{index .Config.Labels "io.github.openbar.container_id"}}'
+FORMAT="${FORMAT}\t{{.Created}}\t{{.Size}}\t{{len .RepoTags}}\t{{.Id}}"
+
+AWK_SCRIPT=$(dirname "$0")/container-gc.awk
+
+# shellcheck disable=SC2086
+IMAGES=$("${ENGINE}" image inspect --format "${FORMAT}" ${IDS}) || exit 1
+
+REMOVED=0
+FREED=0
+TOTAL=0
+
+# The sizes of the images which failed to be removed (for example, as they
+# are used by a container) are kept in the total size.
+echo "${IMAGES}" | awk -v CREATED=1 -f "${AWK_SCRIPT}" |
+	sort -t "$(printf '\t')" -k 2,2r |
+	awk -v KEEP="${KEEP}" -f "${AWK_SCRIPT}" >"${TMPDIR}/remove" || exit 1
+
+while IFS="$(printf '\t')" read -r ACTION SIZE ID; do
+	case "${ACTION}" in
+	total)
+		TOTAL=${SIZE}
+		continue
+		;;
+	budget)
+		if [ "${BUDGET}" = 0 ] || [ $((TOTAL - FREED)) -le "${BUDGET}" ]; then
+			break
+		fi
+		;;
+	*) ;;
+	esac
+
+	if "${ENGINE}" rmi "${ID}" </dev/null >/dev/null; then
+		REMOVED=$((REMOVED + 1))
+		FREED=$((FREED + SIZE))
+	fi
+done <"${TMPDIR}/remove"
+
+echo "Removed ${REMOVED} ${ENGINE} images of the project ${PROJECT_ID}"
+
+if [ "${BUDGET}" != 0 ] && [ $((TOTAL - FREED)) -gt "${BUDGET}" ]; then
+	USED=$(numfmt --to=iec $((TOTAL - FREED)))
+	echo >&2 "Warning: ${USED} of images left for a budget of $4"
+fi
@@ -0,0 +1,89 @@
+#!/bin/sh
+# shellcheck shell=sh enable=all
+
+# Usage: container-jobserver.sh <directory> <command...>
+#
+# Run the <command> sharing the jobserver of the calling make(1) as a FIFO
+# jobserver, created in the <directory>. The MAKEFLAGS are set to advertise
+# it, so they must be given to the container, where the <directory> must be
+# mounted at the same path.
+#
+# While the <command> runs, the tokens released by the calling make(1) are
+# relayed to the FIFO. Once done, the tokens are given back.
+
+if [ "${OB_VERBOSE:-0}" = 1 ]; then
+	set -x
+fi
+
+DIRECTORY=$1
+shift
+
+JOBS=
+AUTH=
+
+set -f
+
+for FLAG in ${MAKEFLAGS}; do
+	case "${FLAG}" in
+	--) break ;;
+	-j*) JOBS=${FLAG} ;;
+	--jobserver-auth=*) AUTH=${FLAG#--jobserver-auth=} ;;
+	*) ;;
+	esac
+done
+
+set +f
+
+# The pipe file descriptors are opened again using their path, as the
+# jobserver read side may be non-blocking.
+case "${AUTH}" in
+fifo:*)
+	INPUT=${AUTH#fifo:}
+	OUTPUT=${AUTH#fifo:}
+	;;
+[0-9]*,[0-9]*)
+	INPUT=/dev/fd/${AUTH%,*}
+	OUTPUT=/dev/fd/${AUTH#*,}
+	;;
+*)
+	INPUT=
+	OUTPUT=
+	;;
+esac
+
+# Without a usable jobserver (none, or a pipe jobserver whose file descriptors
+# were not inherited), the <command> uses its own jobs.
+if [ ! -e "${INPUT}" ] || [ ! -e "${OUTPUT}" ]; then
+	MAKEFLAGS=${JOBS}
+	export MAKEFLAGS
+	exec "$@"
+fi
+
+FIFO=${DIRECTORY}/$$.fifo
+
+mkdir -p "${DIRECTORY}"
+rm -f "${FIFO}"
+mkfifo "${FIFO}" || exit 1
+
+# Keep the FIFO opened, so that it can be read and written without blocking.
+exec 9<>"${FIFO}"
+
+cat "${INPUT}" >&9 &
+RELAY=$!
+
+## cleanup
+# Stop the relay and give the remaining tokens back.
+cleanup() {
+	kill "${RELAY}" 2>/dev/null
+	wait "${RELAY}" 2>/dev/null
+	dd if="${FIFO}" iflag=nonblock bs=4096 count=1 2>/dev/null >>"${OUTPUT}"
+	rm -f "${FIFO}"
+}
+
+trap cleanup EXIT
+trap 'exit 1' HUP INT TERM
+
+MAKEFLAGS="${JOBS} --jobserver-auth=fifo:${FIFO}"
+export MAKEFLAGS
+
+"$@"
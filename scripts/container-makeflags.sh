@@ -0,0 +1,44 @@
+#!/bin/sh
+# shellcheck shell=sh enable=all
+
+# Usage: container-makeflags.sh <make> <args...>
+#
+# Run the <make> command inside the container, keeping the FIFO jobserver
+# advertised by the MAKEFLAGS (see container-jobserver.sh) only if the <make>
+# supports it (GNU make 4.4 or later). The older versions reject it, so it is
+# removed from the MAKEFLAGS and the <make> uses its own jobs instead.
+
+if [ "${OB_VERBOSE:-0}" = 1 ]; then
+	set -x
+fi
+
+case " ${MAKEFLAGS} " in
+*" --jobserver-auth=fifo:"*) ;;
+*) exec "$@" ;;
+esac
+
+# shellcheck disable=SC2016
+FEATURES=$(echo 'all:;@echo $(.FEATURES)' | MAKEFLAGS='' "$1" -f - 2>/dev/null)
+
+case " ${FEATURES} " in
+*" jobserver-fifo "*) exec "$@" ;;
+*) ;;
+esac
+
+FLAGS=
+
+set -f
+
+for FLAG in ${MAKEFLAGS}; do
+	case "${FLAG}" in
+	--jobserver-auth=*) ;;
+	*) FLAGS="${FLAGS:+${FLAGS} }${FLAG}" ;;
+	esac
+done
+
+set +f
+
+MAKEFLAGS=${FLAGS}
+export MAKEFLAGS
+
+exec "$@"
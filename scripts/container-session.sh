@@ -0,0 +1,105 @@
+#!/bin/sh
+# shellcheck shell=sh enable=all
+
+# Manage a long-lived session container.
+#
+# Usage: container-session.sh start <engine> <name> <run command...>
+#   Run the <run command> to start the session container, unless the <name>
+#   container is already running.
+#
+# Usage: container-session.sh idle <timeout>
+#   Keep the session container alive (this is its main process) until no
+#   command has been executed inside it for <timeout> seconds (0 to disable).
+#
+# Usage: container-session.sh exec <command...>
+#   Execute a <command> inside the session container and record its activity.
+
+if [ "${OB_VERBOSE:-0}" = 1 ]; then
+	set -x
+fi
+
+SESSION_DIR=/tmp/openbar-session
+
+## is_running <engine> <name>
+is_running() {
+	STATE=$("$1" container inspect --format "{{.State.Running}}" "$2" 2>/dev/null)
+	[ "${STATE}" = true ]
+}
+
+case "$1" in
+start)
+	ENGINE=$2
+	NAME=$3
+	shift 3
+
+	if is_running "${ENGINE}" "${NAME}"; then
+		exit 0
+	fi
+
+	"${ENGINE}" rm -f "${NAME}" >/dev/null 2>&1
+
+	# Another make(1) instance may have started the same session.
+	if ! "$@" >/dev/null && ! is_running "${ENGINE}" "${NAME}"; then
+		exit 1
+	fi
+
+	# Wait for the session to be ready.
+	until "${ENGINE}" exec "${NAME}" test -f "${SESSION_DIR}/activity" 2>/dev/null; do
+		if ! is_running "${ENGINE}" "${NAME}"; then
+			echo >&2 "Failed to start the session container ${NAME}"
+			exit 1
+		fi
+
+		sleep 0.1
+	done
+	;;
+
+idle)
+	TIMEOUT=$2
+
+	mkdir -p "${SESSION_DIR}/running"
+	date +%s >"${SESSION_DIR}/activity"
+
+	while sleep 5; do
+		RUNNING=0
+
+		for FILE in "${SESSION_DIR}"/running/*; do
+			if [ ! -f "${FILE}" ]; then
+				continue
+			elif kill -0 "${FILE##*/}" 2>/dev/null; then
+				RUNNING=1
+			else
+				rm -f "${FILE}"
+			fi
+		done
+
+		if [ "${RUNNING}" = 1 ] || [ "${TIMEOUT}" = 0 ]; then
+			continue
+		fi
+
+		read -r ACTIVITY <"${SESSION_DIR}/activity"
+		NOW=$(date +%s)
+
+		if [ $((NOW - ACTIVITY)) -ge "${TIMEOUT}" ]; then
+			exit 0
+		fi
+	done
+	;;
+
+exec)
+	shift
+
+	touch "${SESSION_DIR}/running/$$"
+	"$@"
+	STATUS=$?
+	rm -f "${SESSION_DIR}/running/$$"
+	date +%s >"${SESSION_DIR}/activity"
+
+	exit "${STATUS}"
+	;;
+
+*)
+	echo >&2 "Invalid command: $1"
+	exit 1
+	;;
+esac
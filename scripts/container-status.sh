@@ -1,26 +1,82 @@
 #!/bin/sh
 # shellcheck shell=sh enable=all
 
+# Usage: container-status.sh <engine> <tag> <stamp> [sha1]
+#
+# Print the status of the image <tag>: "ok", "newer" (the image was built
+# from another [sha1]) or "missing".
+#
+# The <stamp> file records the tag, the image ID and the sha1 of the last
+# image found up to date. While it matches, a single engine query is needed
+# to check that the image is still there.
+
 if [ "${OB_VERBOSE:-0}" = 1 ]; then
 	set -x
 fi
 
-if [ $# -ge 3 ] && [ "${2%%/*}" = localhost ] && [ -f "$3" ]; then
-	SHA1=$(sha1sum "$3" | awk '{print $1}')
-	ID=$("$1" image ls -q -f "reference=$2" -f "label=io.github.openbar.sha1=${SHA1}")
+ENGINE=$1
+TAG=$2
+STAMP=$3
+SHA1=${4:--}
+
+## image_id
+image_id() {
+	"${ENGINE}" image inspect --format "{{.Id}}" "${TAG}" 2>/dev/null
+}
+
+## image_ok <id>
+image_ok() {
+	mkdir -p "$(dirname "${STAMP}")"
+	echo "${TAG} $1 ${SHA1}" >"${STAMP}"
+	echo ok
+}
+
+if [ $# -lt 3 ]; then
+	echo invalid
+	exit 0
+elif [ "${TAG%%/*}" = localhost ] && [ "${SHA1}" = - ]; then
+	echo invalid
+	exit 0
+elif [ "${TAG%%/*}" != localhost ] && [ "${SHA1}" != - ]; then
+	echo invalid
+	exit 0
+fi
+
+# Use the stamp if the tag and the sha1 have not changed.
+if [ -f "${STAMP}" ]; then
+	read -r STAMP_TAG STAMP_ID STAMP_SHA1 <"${STAMP}"
+
+	if [ "${STAMP_TAG}" = "${TAG}" ] && [ "${STAMP_SHA1}" = "${SHA1}" ]; then
+		ID=$(image_id)
+
+		if [ -z "${ID}" ]; then
+			rm -f "${STAMP}"
+			echo missing
+			exit 0
+		elif [ "${ID}" = "${STAMP_ID}" ]; then
+			echo ok
+			exit 0
+		fi
+	fi
+fi
+
+rm -f "${STAMP}"
+
+if [ "${SHA1}" != - ]; then
+	ID=$("${ENGINE}" image ls -q -f "reference=${TAG}" -f "label=io.github.openbar.sha1=${SHA1}")
 	if [ -n "${ID}" ]; then
-		echo ok
-	elif "$1" inspect "$2" >/dev/null 2>&1; then
+		ID=$(image_id)
+		image_ok "${ID}"
+	elif "${ENGINE}" inspect "${TAG}" >/dev/null 2>&1; then
 		echo newer
 	else
 		echo missing
 	fi
-elif [ $# -eq 2 ] && [ "${2%%/*}" != localhost ]; then
-	if "$1" inspect "$2" >/dev/null 2>&1; then
-		echo ok
+else
+	ID=$(image_id)
+	if [ -n "${ID}" ]; then
+		image_ok "${ID}"
 	else
 		echo missing
 	fi
-else
-	echo invalid
 fi
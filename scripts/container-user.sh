@@ -0,0 +1,60 @@
+#!/bin/sh
+# shellcheck shell=sh enable=all
+
+# Usage: container-user.sh <engine> <image> <user image> <home> [build args...]
+#
+# Build the <user image>, derived from the <image>, with the docker user and
+# its <home> directory already created for the current UID and GID. The image
+# is only built if the <image>, the UID, the GID or the OB_DOCKER_GROUPS have
+# changed since the last build.
+
+if [ "${OB_VERBOSE:-0}" = 1 ]; then
+	set -x
+fi
+
+set -e
+
+ENGINE=$1
+IMAGE=$2
+USER_IMAGE=$3
+USER_HOME=$4
+shift 4
+
+USER_ID=$(id -u)
+GROUP_ID=$(id -g)
+
+LABEL=io.github.openbar.user
+
+INFO=$("${ENGINE}" image inspect \
+	--format "{{.Id}} {{index .Config.Labels \"${LABEL}\"}}" \
+	"${IMAGE}" "${USER_IMAGE}" 2>/dev/null || true)
+
+IMAGE_ID=$(echo "${INFO}" | sed -n '1s/ .*//p')
+CURRENT_KEY=$(echo "${INFO}" | sed -n '2s/^[^ ]* //p')
+
+KEY=$(echo "${IMAGE_ID} ${USER_ID} ${GROUP_ID} ${USER_HOME} ${OB_DOCKER_GROUPS:-}" |
+	sha1sum | cut -d " " -f 1)
+
+if [ "${KEY}" = "${CURRENT_KEY}" ]; then
+	exit 0
+fi
+
+echo "Building ${ENGINE} image '${USER_IMAGE#localhost/}'"
+
+SCRIPTS_DIR=$(dirname "$0")
+
+if [ "${OB_VERBOSE:-0}" = 1 ]; then
+	OUTPUT=/dev/stdout
+else
+	OUTPUT=/dev/null
+fi
+
+"${ENGINE}" build -t "${USER_IMAGE}" \
+	-f "${SCRIPTS_DIR}/container-user.Dockerfile" \
+	--build-arg OB_BASE_IMAGE="${IMAGE}" \
+	--build-arg OB_DOCKER_HOME="${USER_HOME}" \
+	--build-arg OB_DOCKER_UID="${USER_ID}" \
+	--build-arg OB_DOCKER_GID="${GROUP_ID}" \
+	--build-arg OB_DOCKER_GROUPS="${OB_DOCKER_GROUPS:-}" \
+	--label "${LABEL}=${KEY}" \
+	"$@" "${SCRIPTS_DIR}" >"${OUTPUT}"
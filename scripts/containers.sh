@@ -0,0 +1,47 @@
+#!/bin/sh
+# shellcheck shell=sh enable=all
+
+# Usage: containers.sh <jobs> <makefile> <directory> <defconfigs>
+#
+# Build or pull the container image of each of the <defconfigs>, located in
+# the <directory>, running at most <jobs> of them concurrently. The <makefile>
+# is the container layer, which is used to get the image tag of a default
+# configuration and to build or pull its image. Each image is handled once,
+# using the first default configuration which selects it.
+
+if [ "${OB_VERBOSE:-0}" = 1 ]; then
+	set -x
+fi
+
+MAKE=${MAKE:-make}
+
+# Build or pull the image of a single default configuration.
+# Usage: containers.sh --prefetch <makefile> <defconfig file>
+if [ "$1" = --prefetch ]; then
+	exec ${MAKE} -f "$2" OB_CONFIG_FILE="$3" .container
+fi
+
+JOBS=$1
+MAKEFILE=$2
+DIRECTORY=$3
+DEFCONFIGS=$4
+
+TMPDIR=$(mktemp -d)
+trap 'rm -rf "${TMPDIR}"' EXIT
+
+TAGS=" "
+
+# The tags are resolved sequentially, as the digest of a build context is
+# cached in a file shared by the default configurations using it.
+for DEFCONFIG in ${DEFCONFIGS}; do
+	TAG=$(${MAKE} -f "${MAKEFILE}" OB_CONFIG_FILE="${DIRECTORY}/${DEFCONFIG}" .container-tag) || exit 1
+
+	case "${TAGS}" in
+	*" ${TAG} "*) continue ;;
+	*) TAGS="${TAGS}${TAG} " ;;
+	esac
+
+	echo "${DIRECTORY}/${DEFCONFIG}"
+done >"${TMPDIR}/defconfigs"
+
+xargs -r -n 1 -P "${JOBS}" "$0" --prefetch "${MAKEFILE}" <"${TMPDIR}/defconfigs"
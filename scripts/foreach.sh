@@ -0,0 +1,89 @@
+#!/bin/sh
+# shellcheck shell=sh enable=all
+
+# Usage: foreach.sh <jobs> <directory> <defconfigs> [targets]
+#
+# Build the [targets] for each of the <defconfigs>, running at most <jobs>
+# builds concurrently. Each build uses its own configuration file and build
+# directory inside the <directory>, so the current configuration is kept.
+#
+# The output of each build is saved in a log file and a summary is printed
+# once all the builds are done.
+
+if [ "${OB_VERBOSE:-0}" = 1 ]; then
+	set -x
+fi
+
+MAKE=${MAKE:-make}
+
+# Build the targets for a single default configuration.
+# Usage: foreach.sh --build <directory> <targets> <defconfig>
+if [ "$1" = --build ]; then
+	BUILD_DIR=$2/$4
+	START=$(date +%s)
+
+	mkdir -p "${BUILD_DIR}"
+
+	# shellcheck disable=SC2086
+	if {
+		${MAKE} O="${BUILD_DIR}" OB_CONFIG_FILE="${BUILD_DIR}/.config" "$4" &&
+			${MAKE} O="${BUILD_DIR}" OB_CONFIG_FILE="${BUILD_DIR}/.config" $3
+	} >"${BUILD_DIR}/foreach.log" 2>&1; then
+		STATUS=PASS
+	else
+		STATUS=FAIL
+	fi
+
+	DURATION=$(($(date +%s) - START))
+
+	echo "${STATUS} ${DURATION}" >"${BUILD_DIR}/foreach.status"
+	echo "[${STATUS}] $4 (${DURATION}s)"
+	exit 0
+fi
+
+JOBS=$1
+DIRECTORY=$2
+DEFCONFIGS=$3
+TARGETS=$4
+
+START=$(date +%s)
+
+for DEFCONFIG in ${DEFCONFIGS}; do
+	rm -f "${DIRECTORY}/${DEFCONFIG}/foreach.status"
+done
+
+# shellcheck disable=SC2086
+printf '%s\n' ${DEFCONFIGS} |
+	xargs -r -n 1 -P "${JOBS}" "$0" --build "${DIRECTORY}" "${TARGETS}"
+
+PASSED=0
+FAILED=0
+
+echo
+echo "Summary:"
+
+for DEFCONFIG in ${DEFCONFIGS}; do
+	STATUS_FILE=${DIRECTORY}/${DEFCONFIG}/foreach.status
+
+	if [ -f "${STATUS_FILE}" ]; then
+		read -r STATUS DURATION <"${STATUS_FILE}"
+	else
+		STATUS=FAIL
+		DURATION=0
+	fi
+
+	if [ "${STATUS}" = PASS ]; then
+		PASSED=$((PASSED + 1))
+		printf '  %s  %-30s %6ss\n' "${STATUS}" "${DEFCONFIG}" "${DURATION}"
+	else
+		FAILED=$((FAILED + 1))
+		printf '  %s  %-30s %6ss  (see %s)\n' "${STATUS}" "${DEFCONFIG}" \
+			"${DURATION}" "${DIRECTORY}/${DEFCONFIG}/foreach.log"
+	fi
+done
+
+DURATION=$(($(date +%s) - START))
+
+echo "${PASSED} passed, ${FAILED} failed in ${DURATION}s"
+
+[ "${FAILED}" -eq 0 ]
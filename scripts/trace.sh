@@ -0,0 +1,101 @@
+#!/bin/sh
+# shellcheck shell=sh enable=all
+
+# Record events in a trace file, using the Chrome trace event format. The
+# resulting file can be opened by chrome://tracing or https://ui.perfetto.dev.
+#
+# Usage: trace.sh <file> <pid> M <name>
+#   Name the <pid> process. This also starts the trace file if needed.
+#
+# Usage: trace.sh <file> <pid> B|E <name> <category>
+#   Record the begin or the end of the <name> event.
+#
+# Usage: trace.sh <file> <pid> run <name> <category> <shell> <args...>
+#   Run a recipe line using the <shell> and record it as a <name> event.
+#   This is used as the SHELL of the traced targets.
+#
+# The events of the "target" category use a track per <name>, so that the
+# targets can run concurrently. The other events use the main track of the
+# process. The events are timestamped using the system clock, so the events
+# recorded inside the container are merged with the other ones.
+
+FILE=$1
+PID=$2
+PHASE=$3
+NAME=$4
+CATEGORY=$5
+
+## timestamp
+# Set the TIMESTAMP to the current time in microseconds.
+timestamp() {
+	TIMESTAMP=$(date +%s%6N)
+
+	# Fallback for date(1) implementations without nanoseconds support.
+	case "${TIMESTAMP}" in
+	*[!0-9]*) TIMESTAMP=$(date +%s)000000 ;;
+	*) ;;
+	esac
+}
+
+## event <phase>
+event() {
+	timestamp
+	printf '{"name":"%s","cat":"%s","ph":"%s","ts":%s,"pid":%s,"tid":%s},\n' \
+		"${NAME}" "${CATEGORY}" "$1" "${TIMESTAMP}" "${PID}" "${TID}" >>"${FILE}"
+}
+
+## metadata <name> <tid> <value>
+metadata() {
+	printf '{"name":"%s","ph":"M","pid":%s,"tid":%s,"args":{"name":"%s"}},\n' \
+		"$1" "${PID}" "$2" "$3" >>"${FILE}"
+}
+
+case "${NAME}" in
+*[\\\"]*) NAME=$(printf '%s' "${NAME}" | sed 's/[\\"]/\\&/g') ;;
+*) ;;
+esac
+
+case "${CATEGORY}" in
+target) TID=$(printf '%s' "${NAME}" | cksum | cut -d " " -f 1) ;;
+*) TID=0 ;;
+esac
+
+case "${PHASE}" in
+M)
+	if [ ! -s "${FILE}" ]; then
+		echo "[" >"${FILE}"
+	fi
+
+	metadata process_name 0 "${NAME}"
+	metadata thread_name 0 openbar
+	;;
+
+B | E)
+	event "${PHASE}"
+	;;
+
+run)
+	shift 5
+
+	# Do not leak the trace script to the environment of the recipe.
+	if [ "${SHELL:-}" = "$0" ]; then
+		SHELL=$1
+	fi
+
+	if [ "${TID}" != 0 ]; then
+		metadata thread_name "${TID}" "${NAME}"
+	fi
+
+	event B
+	"$@"
+	STATUS=$?
+	event E
+
+	exit "${STATUS}"
+	;;
+
+*)
+	echo >&2 "Invalid phase: ${PHASE}"
+	exit 1
+	;;
+esac
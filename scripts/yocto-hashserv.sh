@@ -0,0 +1,82 @@
+#!/bin/sh
+# shellcheck shell=sh enable=all
+
+# Manage the hash equivalence server sidecar container.
+#
+# Usage: yocto-hashserv.sh start <engine> <name> <socket> <run command...>
+#   Run the <run command> to start the <name> sidecar container, unless it is
+#   already running. Then wait for the server <socket>. A running sidecar is
+#   used as is, whatever its image, as it may be used by other configurations
+#   or by running builds.
+#
+# Usage: yocto-hashserv.sh serve <initenv script> <directory>
+#   Run the bitbake-hashserv(1) server (this is the sidecar main process). The
+#   <initenv script> is used to find the server, and its database and socket
+#   are located in the <directory>.
+
+if [ "${OB_VERBOSE:-0}" = 1 ]; then
+	set -x
+fi
+
+## is_running <engine> <name>
+is_running() {
+	STATE=$("$1" container inspect --format "{{.State.Running}}" "$2" 2>/dev/null)
+	[ "${STATE}" = true ]
+}
+
+case "$1" in
+start)
+	ENGINE=$2
+	NAME=$3
+	SOCKET=$4
+	shift 4
+
+	if is_running "${ENGINE}" "${NAME}"; then
+		exit 0
+	fi
+
+	# Only a stopped sidecar is removed, not one just started by another
+	# make(1) instance.
+	"${ENGINE}" rm "${NAME}" >/dev/null 2>&1
+
+	# Another make(1) instance may have started the same server.
+	if ! "$@" >/dev/null && ! is_running "${ENGINE}" "${NAME}"; then
+		exit 1
+	fi
+
+	# Wait for the server to be ready.
+	until [ -S "${SOCKET}" ]; do
+		if ! is_running "${ENGINE}" "${NAME}"; then
+			echo >&2 "Failed to start the hash equivalence server ${NAME}"
+			exit 1
+		fi
+
+		sleep 0.1
+	done
+	;;
+
+serve)
+	INITENV_SCRIPT=$2
+	DIRECTORY=$3
+
+	# The initialization script sets the PATH and requires a build
+	# directory. A dedicated one is used. Some shells can only source it
+	# from its own directory.
+	cd "$(dirname "${INITENV_SCRIPT}")" || exit 1
+	set -- "${DIRECTORY}/build"
+	# shellcheck disable=SC1090
+	. "./$(basename "${INITENV_SCRIPT}")" >/dev/null
+
+	# The socket of a previous server may be left over.
+	rm -f "${DIRECTORY}/hashserv.sock"
+
+	exec bitbake-hashserv \
+		--bind "unix://${DIRECTORY}/hashserv.sock" \
+		--database "${DIRECTORY}/hashserv.db"
+	;;
+
+*)
+	echo >&2 "Invalid command: $1"
+	exit 1
+	;;
+esac
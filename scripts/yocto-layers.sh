@@ -0,0 +1,97 @@
+#!/bin/sh
+# shellcheck shell=sh enable=all
+
+# Usage: yocto-layers.sh check <stamp> <bblayers> [layers...]
+#   Succeed if the <bblayers> file is up to date.
+#
+# Usage: yocto-layers.sh update <stamp> <bblayers> [layers...]
+#   Unless the <bblayers> file is up to date, add all the [layers] using a
+#   single bitbake-layers call and validate the resulting configuration.
+#
+# The <stamp> file records the configured [layers] and template, along with
+# the sha1 of the resulting <bblayers> file. So the configuration is done
+# again if any of them changed, including a manual modification.
+
+if [ "${OB_VERBOSE:-0}" = 1 ]; then
+	set -x
+fi
+
+COMMAND=$1
+STAMP=$2
+BBLAYERS=$3
+shift 3
+
+# The template used by the OE/Yocto initialization script.
+TEMPLATE=${TEMPLATECONF:+${TEMPLATECONF}/bblayers.conf.sample}
+
+## key
+# Print the sha1 of the configured layers and template.
+key() {
+	printf '%s\n' "$@"
+	echo "${TEMPLATE}"
+
+	if [ -f "${TEMPLATE}" ]; then
+		cat "${TEMPLATE}"
+	fi
+}
+
+KEY=$(key "$@" | sha1sum)
+KEY=${KEY%% *}
+
+## up_to_date
+up_to_date() {
+	if [ ! -f "${STAMP}" ] || [ ! -f "${BBLAYERS}" ]; then
+		return 1
+	fi
+
+	read -r STAMP_KEY <"${STAMP}"
+
+	if [ "${STAMP_KEY}" != "${KEY}" ]; then
+		return 1
+	fi
+
+	tail -n +2 "${STAMP}" | sha1sum --check --status
+}
+
+case "${COMMAND}" in
+check)
+	up_to_date
+	;;
+
+update)
+	# shellcheck disable=SC2310
+	if up_to_date; then
+		exit 0
+	fi
+
+	set -e
+
+	rm -f "${STAMP}"
+
+	if [ "${OB_VERBOSE:-0}" = 1 ]; then
+		OUTPUT=/dev/stdout
+	else
+		OUTPUT=/dev/null
+	fi
+
+	if [ $# -gt 0 ]; then
+		bitbake-layers add-layer -F "$@" >"${OUTPUT}"
+	fi
+
+	bitbake-layers show-layers >"${OUTPUT}"
+
+	mkdir -p "$(dirname "${STAMP}")"
+
+	{
+		echo "${KEY}"
+		sha1sum "${BBLAYERS}"
+	} >"${STAMP}.tmp"
+
+	mv "${STAMP}.tmp" "${STAMP}"
+	;;
+
+*)
+	echo >&2 "Invalid command: ${COMMAND}"
+	exit 1
+	;;
+esac
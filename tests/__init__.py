@@ -1,11 +1,22 @@
+import collections
 import logging
 import os
 import shlex
 import subprocess
+import threading
+import time
 from pathlib import Path
 
 logger = logging.getLogger(__name__)
 
+# The number of output lines kept for each stream of a command, and the number
+# of them shown when it fails.
+COMMAND_OUTPUT_LINES = 10000
+COMMAND_ERROR_LINES = 100
+
+# The timings of all the commands run during the session (see conftest.py).
+COMMAND_TIMINGS = []
+
 
 def get_container_tag(project_id, container_id):
     return f"localhost/openbar/{project_id}/{container_id}:latest"
@@ -60,50 +71,94 @@ class CommandNotFoundError(FileNotFoundError):
 
 
 class CommandError(RuntimeError):
-    def __init__(self, completed):
-        self.command = completed.args
-        self.returncode = completed.returncode
-        self.stdout = completed.stdout.decode("utf-8").splitlines()
-        self.stderr = completed.stderr.decode("utf-8").splitlines()
+    def __init__(self, command, returncode, stdout, stderr):
+        self.command = command
+        self.returncode = returncode
+        self.stdout = stdout
+        self.stderr = stderr
+        stdout_tail = "\n".join(stdout[-COMMAND_ERROR_LINES:])
+        stderr_tail = "\n".join(stderr[-COMMAND_ERROR_LINES:])
         msg = (
-            f"\n\nPROCESS: {shlex.join(completed.args)}"
-            f"\n\nRETURN:  {completed.returncode}"
-            f"\n\nSTDOUT:\n{completed.stdout.decode('utf-8')}"
-            f"\n\nSTDERR:\n{completed.stderr.decode('utf-8')}"
+            f"\n\nPROCESS: {shlex.join(command)}"
+            f"\n\nRETURN:  {returncode}"
+            f"\n\nSTDOUT:\n{stdout_tail}"
+            f"\n\nSTDERR:\n{stderr_tail}"
         )
         super().__init__(msg)
 
 
+def command_read(stream, lines, name, quiet):
+    for data in iter(stream.readline, b""):
+        for line in data.decode("utf-8", errors="replace").splitlines():
+            lines.append(line)
+
+            if not quiet:
+                logger.debug(f"{name}: {line}")
+
+    stream.close()
+
+
 def command_run(*args, **kwargs):
     command_parts = [str(x) for x in args]
 
     logger.debug(f"COMMAND: {shlex.join(command_parts)}")
 
+    start = time.perf_counter()
+
     try:
-        completed = subprocess.run(  # noqa: S603
+        process = subprocess.Popen(  # noqa: S603
             command_parts,
             shell=False,
-            check=False,
-            capture_output=True,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
             env=kwargs.get("_env"),
         )
     except FileNotFoundError:
         raise CommandNotFoundError(command_parts)
 
-    if completed.returncode not in kwargs.get("_ok_code", [0]):
-        raise CommandError(completed)
-
-    stdout = completed.stdout.decode("utf-8").splitlines()
-    stderr = completed.stderr.decode("utf-8").splitlines()
-
-    if not kwargs.get("_quiet", False):
-        if stdout:
-            logger.debug("STDOUT:")
-            for line in stdout:
-                logger.debug(line)
-        if stderr:
-            logger.debug("STDERR:")
-            for line in stderr:
-                logger.debug(line)
+    # The output is logged as it arrives, and only its last lines are kept.
+    stdout = collections.deque(maxlen=COMMAND_OUTPUT_LINES)
+    stderr = collections.deque(maxlen=COMMAND_OUTPUT_LINES)
+    quiet = kwargs.get("_quiet", False)
+
+    readers = [
+        threading.Thread(
+            target=command_read, args=(process.stdout, stdout, "STDOUT", quiet)
+        ),
+        threading.Thread(
+            target=command_read, args=(process.stderr, stderr, "STDERR", quiet)
+        ),
+    ]
+
+    for reader in readers:
+        reader.start()
+
+    # The command is waited for using wait4(2) to get its own resource usage,
+    # which includes the descendants it waited for.
+    _, status, rusage = os.wait4(process.pid, 0)
+    process.returncode = os.waitstatus_to_exitcode(status)
+
+    for reader in readers:
+        reader.join()
+
+    wall = time.perf_counter() - start
+    cpu = rusage.ru_utime + rusage.ru_stime
+
+    logger.debug(f"TIME: {wall:.3f}s (cpu {cpu:.3f}s)")
+
+    COMMAND_TIMINGS.append(
+        {
+            "test": os.environ.get("PYTEST_CURRENT_TEST", "").rsplit(" ", 1)[0],
+            "command": shlex.join(command_parts),
+            "returncode": process.returncode,
+            "wall": wall,
+            "cpu": cpu,
+        }
+    )
+
+    if process.returncode not in kwargs.get("_ok_code", [0]):
+        raise CommandError(
+            command_parts, process.returncode, list(stdout), list(stderr)
+        )
 
-    return stdout
+    return list(stdout)
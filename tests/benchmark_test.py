@@ -0,0 +1,55 @@
+import logging
+
+import pytest
+
+from . import command_run
+from . import get_container_tag
+
+logger = logging.getLogger(__name__)
+
+pytestmark = pytest.mark.benchmark
+
+
+def test_noop(create_project, benchmark):
+    project = create_project(defconfig="benchmark_defconfig")
+    benchmark(lambda: project.make("noop"))
+
+
+@pytest.mark.isolated
+def test_noop_session(create_project, benchmark):
+    project = create_project(
+        defconfig="benchmark_defconfig", env={"OB_CONTAINER_SESSION": "1"}
+    )
+    benchmark(lambda: project.make("noop"))
+    project.make("containerclean")
+
+
+def test_help(create_project, benchmark):
+    project = create_project(defconfig="benchmark_defconfig")
+    benchmark(lambda: project.make("help"))
+
+
+def test_defconfig(create_project, benchmark):
+    project = create_project(defconfig="benchmark_defconfig")
+    benchmark(
+        lambda: project.make("hello_defconfig"),
+        setup=lambda: project.make("benchmark_defconfig"),
+    )
+
+
+def test_container_start(create_project, benchmark):
+    project = create_project(defconfig="benchmark_defconfig")
+    project.make("noop")
+    container_tag = get_container_tag(project.id, "default")
+    benchmark(
+        lambda: command_run(
+            project.container_engine, "run", "--rm", container_tag, "true"
+        )
+    )
+
+
+@pytest.mark.parametrize("jobs", [None, 3])
+def test_foreach(project_dirs, create_project, benchmark, jobs):
+    project = create_project(defconfig_dir=project_dirs.tests_data_dir / "foreach")
+    cli = {"J": jobs} if jobs else {}
+    benchmark(lambda: project.make("foreach", ".goodbye", cli=cli))
@@ -4,9 +4,13 @@ import pytest
 
 from . import check_container_build
 from . import check_container_pull
+from . import command_run
+from . import get_container_tag
 
 logger = logging.getLogger(__name__)
 
+pytestmark = pytest.mark.isolated
+
 
 def test_build(create_project):
     project = create_project(defconfig="hello_defconfig", cli={"B": "1"})
@@ -17,6 +21,108 @@ def test_build(create_project):
     assert stdout[1] == "Hello"
 
 
+def test_status_stamp(create_project):
+    project = create_project(defconfig="hello_defconfig")
+    project.make(cli={"B": "1"})
+
+    stamp_dir = project.root_dir / "build/.openbar/container"
+
+    # The status is stamped by the next check.
+    stdout = project.make()
+    assert stdout == ["Hello"]
+    stamps = list(stamp_dir.glob("*.status"))
+    assert len(stamps) == 1
+
+    # The stamp is used as long as the image is there.
+    stdout = project.make()
+    assert stdout == ["Hello"]
+    assert list(stamp_dir.glob("*.status")) == stamps
+
+
+def test_build_context(create_project, project_dirs, tmp_path):
+    container_dir = tmp_path / "container"
+    context_dir = container_dir / "default"
+    context_dir.mkdir(parents=True)
+
+    dockerfile = (project_dirs.container_dir / "default/Dockerfile").read_text()
+    (context_dir / "Dockerfile").write_text(f"{dockerfile}\nCOPY file /opt/file\n")
+    (context_dir / ".dockerignore").write_text("ignored\n")
+    (context_dir / "file").write_text("1")
+    (context_dir / "ignored").write_text("1")
+
+    project = create_project(defconfig="hello_defconfig", container_dir=container_dir)
+    project.make()
+
+    # The ignored files are not part of the digest.
+    (context_dir / "ignored").write_text("2")
+    stdout = project.make()
+    assert stdout == ["Hello"]
+
+    # Any other file of the context is.
+    (context_dir / "file").write_text("2")
+    stdout = project.make()
+    check_container_build(project, stdout[0], "default")
+    assert stdout[1] == "Hello"
+
+    stdout = project.make()
+    assert stdout == ["Hello"]
+
+
+def test_container_gc(create_project, project_dirs, tmp_path):
+    container_dir = tmp_path / "container"
+    context_dir = container_dir / "default"
+    context_dir.mkdir(parents=True)
+
+    dockerfile = (project_dirs.container_dir / "default/Dockerfile").read_text()
+    (context_dir / "Dockerfile").write_text(f"{dockerfile}\nCOPY file /opt/file\n")
+
+    keep = 2
+    project = create_project(
+        defconfig="hello_defconfig",
+        container_dir=container_dir,
+        env={"OB_CONTAINER_GC": "1", "OB_CONTAINER_GC_KEEP": keep},
+    )
+
+    # Each build leaves the previous image dangling.
+    for content in ("1", "2", "3"):
+        (context_dir / "file").write_text(content)
+        stdout = project.make()
+        assert stdout[-1] == "Hello"
+
+    # Only the current image and the most recent dangling one are kept.
+    images = command_run(
+        project.container_engine,
+        "images",
+        "-q",
+        "--no-trunc",
+        "--filter",
+        f"label=io.github.openbar.project_id={project.id}",
+        "--filter",
+        "label=io.github.openbar.container_id=default",
+    )
+    assert len(set(images)) == keep
+
+
+@pytest.mark.podman
+def test_build_cache(create_project, tmp_path):
+    cache_dir = tmp_path / "cache"
+    project = create_project(
+        defconfig="hello_defconfig", env={"OB_CONTAINER_CACHE_DIR": cache_dir}
+    )
+    project.make(cli={"B": "1"})
+
+    image_id = cache_dir / f"{project.id}-default/image.id"
+    assert (cache_dir / f"{project.id}-default/image.tar").exists()
+    saved_id = image_id.read_text()
+
+    # The image is loaded from the cache instead of being built again.
+    command_run("podman", "rmi", "-f", get_container_tag(project.id, "default"))
+
+    stdout = project.make()
+    assert stdout[-1] == "Hello"
+    assert image_id.read_text() == saved_id
+
+
 @pytest.mark.parametrize(
     ("project_kwargs", "container_alpine"),
     [
@@ -32,6 +138,7 @@ def test_build(create_project):
         ({"defconfig": "pull_defconfig"}, True),
     ],
 )
+@pytest.mark.xdist_group("ghcr")
 def test_pull(create_project, project_kwargs, container_alpine):
     project = create_project(cli={"P": "1"}, **project_kwargs)
 
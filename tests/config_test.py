@@ -49,6 +49,8 @@ logger = logging.getLogger(__name__)
         ("undefining_defconfig", {}, ["one", "three", ""]),
         # 9.5 Overriding Variables
         ("overriding_defconfig", {"cli": {"TEST_VAR": "env"}}, ["env", "cfg"]),
+        # Variables starting like a special variable name are loaded
+        ("special_defconfig", {}, ["4", "sh"]),
     ],
 )
 def test_variable(project_dirs, create_project, defconfig, make_kwargs, expected):
@@ -202,3 +204,52 @@ def test_function_error(project_dirs, create_project):
     project = create_project(defconfig_dir=defconfig_dir, defconfig="error_defconfig")
     with pytest.raises(CommandError):
         project.make()
+
+
+def test_cache(create_project):
+    project = create_project(
+        config="""
+            include ${OB_ROOT_DIR}/cache.inc
+
+            build:
+            \techo $${TEST_VAR}
+        """,
+        env={"OB_CONFIG_CACHE": "1"},
+    )
+
+    project.write_file("cache.inc", "TEST_VAR = before\n")
+    assert project.make()[-1] == "before"
+    assert (project.root_dir / "build/.openbar/config").is_dir()
+
+    # The cache is reused if nothing changed.
+    assert project.make()[-1] == "before"
+
+    # The cache is invalidated when an included file changes.
+    project.write_file("cache.inc", "TEST_VAR = after\n")
+    assert project.make()[-1] == "after"
+
+    # The cache is invalidated when the exported variables change.
+    stdout = project.make(cli={"TEST_VAR": "cli"})
+    assert stdout[-1] == "cli"
+
+
+@pytest.mark.no_container_engine
+def test_cache_environment(create_project):
+    project = create_project(
+        config="""
+            foo:
+            \techo Foo
+
+            ifdef TEST_ENV_VAR
+            env_target:
+            \techo Env
+            endif
+        """,
+        env={"OB_CONFIG_CACHE": "1"},
+    )
+
+    with pytest.raises(CommandError):
+        project.make("-n", "env_target")
+
+    # The cache is invalidated when the inherited environment changes.
+    project.make("-n", "env_target", env={"TEST_ENV_VAR": "1"})
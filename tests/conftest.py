@@ -1,7 +1,17 @@
+import contextlib
+import fcntl
+import graphlib
+import hashlib
+import json
 import logging
 import os
 import re
 import shlex
+import statistics
+import time
+from concurrent.futures import FIRST_COMPLETED
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import wait
 from pathlib import Path
 from textwrap import dedent
 from typing import NamedTuple
@@ -11,14 +21,20 @@ from git import Repo
 from mergedeep import Strategy
 from mergedeep import merge
 
+from . import COMMAND_TIMINGS
 from . import CommandNotFoundError
 from . import command_run
+from . import get_container_tag
+from . import iter_containers
 
 logger = logging.getLogger(__name__)
 
 
 CONTAINER_ENGINES = ["docker", "podman"]
 
+# The pytest-xdist worker running the tests, if any.
+XDIST_WORKER = os.environ.get("PYTEST_XDIST_WORKER")
+
 
 def command_is_available(command_name):
     try:
@@ -51,6 +67,63 @@ def pytest_addoption(parser):
             action="store_true",
             help=f"run tests with the {engine} engine",
         )
+    group.addoption(
+        "--prebuild-jobs",
+        type=int,
+        default=4,
+        help="number of images prepared concurrently before the tests"
+        " (default: 4, 0 to disable)",
+    )
+
+    group = parser.getgroup("yocto layers")
+    group.addoption(
+        "--yocto-mirror",
+        type=Path,
+        help="clone the yocto layers from the <name>.git mirrors or <name>.bundle"
+        " files of this directory",
+    )
+    group.addoption(
+        "--yocto-network",
+        action="store_true",
+        help="allow the yocto layers to be cloned, or their mirrors to be created"
+        " and updated, using the network",
+    )
+
+    group = parser.getgroup("benchmarks")
+    group.addoption(
+        "--benchmark",
+        action="store_true",
+        help="run the benchmarks and save the results in logs/benchmark.json",
+    )
+    group.addoption(
+        "--benchmark-rounds",
+        type=int,
+        default=5,
+        help="number of measured rounds for each benchmark (default: 5)",
+    )
+    group.addoption(
+        "--benchmark-baseline",
+        type=Path,
+        help="compare the benchmarks with a previously saved results file",
+    )
+    group.addoption(
+        "--benchmark-tolerance",
+        type=float,
+        default=0.2,
+        help="accepted slowdown compared to the baseline (default: 0.2)",
+    )
+
+
+@pytest.hookimpl
+def pytest_collection_modifyitems(config, items):
+    if config.getoption("benchmark"):
+        return
+
+    skip_benchmark = pytest.mark.skip(reason="The benchmarks are not enabled")
+
+    for item in items:
+        if "benchmark" in item.keywords:
+            item.add_marker(skip_benchmark)
 
 
 @pytest.hookimpl
@@ -114,8 +187,150 @@ def pytest_runtest_setup(item):
         logging_plugin.set_log_path(log_file)
 
 
+# The wall and CPU times of all the commands are saved in logs/timings.json, or
+# in a file for each pytest-xdist worker, along with the total of each test.
+# Both are sorted from the slowest.
+@pytest.fixture(scope="session", autouse=True)
+def _command_timings(request):
+    yield
+
+    if not COMMAND_TIMINGS:
+        return
+
+    tests = {}
+
+    for timing in COMMAND_TIMINGS:
+        test = tests.setdefault(timing["test"], {"commands": 0, "wall": 0, "cpu": 0})
+        test["commands"] += 1
+        test["wall"] += timing["wall"]
+        test["cpu"] += timing["cpu"]
+
+    def by_wall(item):
+        return item[1]["wall"]
+
+    timings = {
+        "tests": dict(sorted(tests.items(), key=by_wall, reverse=True)),
+        "commands": sorted(COMMAND_TIMINGS, key=lambda t: t["wall"], reverse=True),
+    }
+
+    name = f"timings-{XDIST_WORKER}" if XDIST_WORKER else "timings"
+    timings_file = request.config.rootpath / f"logs/{name}.json"
+    timings_file.parent.mkdir(parents=True, exist_ok=True)
+
+    with open(timings_file, "w", encoding="utf-8") as stream:
+        json.dump(timings, stream, indent=2)
+
+    logger.info(f"Command timings saved in {timings_file}")
+
+
+def benchmark_results_save(results_file, results):
+    results_file.parent.mkdir(parents=True, exist_ok=True)
+
+    with open(results_file, "w", encoding="utf-8") as stream:
+        json.dump({"benchmarks": results}, stream, indent=2, sort_keys=True)
+
+    logger.info(f"Benchmark results saved in {results_file}")
+
+
+# The benchmark results are saved in logs/benchmark.json. Each pytest-xdist
+# worker saves its own results in a file of its own, which are merged by the
+# controller once all the workers are done (see pytest_sessionfinish).
+@pytest.fixture(scope="session")
+def benchmark_results(request):
+    results = {}
+
+    yield results
+
+    if results:
+        name = f"benchmark-{XDIST_WORKER}" if XDIST_WORKER else "benchmark"
+        benchmark_results_save(request.config.rootpath / f"logs/{name}.json", results)
+
+
+@pytest.hookimpl
+def pytest_sessionfinish(session):
+    if XDIST_WORKER or not session.config.getoption("benchmark"):
+        return
+
+    logs_dir = session.config.rootpath / "logs"
+    worker_files = sorted(logs_dir.glob("benchmark-gw*.json"))
+
+    if not worker_files:
+        return
+
+    results = {}
+
+    for worker_file in worker_files:
+        with open(worker_file, encoding="utf-8") as stream:
+            results.update(json.load(stream)["benchmarks"])
+
+        worker_file.unlink()
+
+    benchmark_results_save(logs_dir / "benchmark.json", results)
+
+
+@pytest.fixture(scope="session")
+def benchmark_baseline(request):
+    baseline_file = request.config.getoption("benchmark_baseline")
+
+    if baseline_file is None:
+        return {}
+
+    with open(baseline_file, encoding="utf-8") as stream:
+        return json.load(stream)["benchmarks"]
+
+
+@pytest.fixture
+def benchmark(request, benchmark_results, benchmark_baseline):
+    rounds = request.config.getoption("benchmark_rounds")
+    tolerance = request.config.getoption("benchmark_tolerance")
+    name = request.node.name
+
+    def _benchmark(function, setup=None):
+        # A first untimed round fills the caches (images, stamps, ...).
+        if setup:
+            setup()
+        function()
+
+        timings = []
+
+        for _ in range(rounds):
+            if setup:
+                setup()
+            start = time.perf_counter()
+            function()
+            timings.append(time.perf_counter() - start)
+
+        result = {
+            "rounds": rounds,
+            "min": min(timings),
+            "median": statistics.median(timings),
+            "max": max(timings),
+        }
+
+        logger.info(
+            f"Benchmark {name}: median {result['median']:.3f}s"
+            f" (min {result['min']:.3f}s, max {result['max']:.3f}s)"
+        )
+
+        if baseline := benchmark_baseline.get(name):
+            result["baseline"] = baseline["median"]
+            result["ratio"] = result["median"] / baseline["median"]
+
+        benchmark_results[name] = result
+
+        if baseline:
+            assert result["ratio"] <= 1 + tolerance, (
+                f"{name} is {result['ratio']:.2f} times slower than the baseline"
+            )
+
+        return result
+
+    return _benchmark
+
+
 class ProjectDirectories(NamedTuple):
     session_dir: Path
+    shared_dir: Path
     openbar_dir: Path
     tests_data_dir: Path
     container_dir: Path
@@ -123,31 +338,299 @@ class ProjectDirectories(NamedTuple):
 
 @pytest.fixture(scope="session")
 def project_dirs(request, tmp_path_factory):
+    session_dir = tmp_path_factory.getbasetemp()
+
     return ProjectDirectories(
-        session_dir=tmp_path_factory.getbasetemp(),
+        session_dir=session_dir,
+        # With pytest-xdist, each worker has its own session directory, located
+        # in a directory shared by all the workers of the session.
+        shared_dir=session_dir.parent if XDIST_WORKER else session_dir,
         openbar_dir=request.config.rootpath,
         tests_data_dir=request.config.rootpath / "tests/data",
         container_dir=request.config.rootpath / "wizard/container",
     )
 
 
-@pytest.fixture(scope="session")
-def yocto_layers_dir(project_dirs):
-    layers_dir = project_dirs.session_dir / "layers"
+# Serialize a section between all the workers of the session.
+@contextlib.contextmanager
+def shared_lock(path):
+    path.parent.mkdir(parents=True, exist_ok=True)
 
-    repos = {
-        "bitbake": "https://git.openembedded.org/bitbake",
-        "openembedded-core": "https://git.openembedded.org/openembedded-core",
-        "meta-yocto": "https://git.yoctoproject.org/meta-yocto",
-    }
+    with open(path, "w", encoding="utf-8") as stream:
+        fcntl.flock(stream, fcntl.LOCK_EX)
+        yield
 
-    for name, url in repos.items():
+
+YOCTO_LAYERS = {
+    "bitbake": "https://git.openembedded.org/bitbake",
+    "openembedded-core": "https://git.openembedded.org/openembedded-core",
+    "meta-yocto": "https://git.yoctoproject.org/meta-yocto",
+}
+
+
+# The yocto layers are cloned from the --yocto-mirror directory, which holds a
+# "<name>.git" mirror or a "<name>.bundle" file for each of them. The clones of
+# a mirror hard link its objects when possible, so they are almost instant, and
+# still work inside the containers where the mirror is not mounted.
+#
+# The network is only used with --yocto-network. Then the missing mirrors are
+# created and the existing ones are updated. Without a mirror directory, the
+# layers are cloned directly, without their history.
+def yocto_layer_clone(name, url, layer_dir, mirror_dir, network):
+    mirror = mirror_dir / f"{name}.git" if mirror_dir else None
+    bundle = mirror_dir / f"{name}.bundle" if mirror_dir else None
+
+    if mirror and network:
+        if mirror.is_dir():
+            logger.info(f"Updating the {name} mirror from {url}")
+            Repo(mirror).git.remote("update", "--prune")
+        else:
+            logger.info(f"Creating the {name} mirror from {url}")
+            Repo.clone_from(url, mirror, mirror=True)
+
+    if mirror and mirror.is_dir():
+        logger.info(f"Cloning {name} from {mirror}")
+        Repo.clone_from(mirror, layer_dir)
+    elif bundle and bundle.is_file():
+        logger.info(f"Cloning {name} from {bundle}")
+        Repo.clone_from(bundle, layer_dir)
+    elif network:
         logger.info(f"Cloning {name} from {url}")
-        Repo.clone_from(url, layers_dir / name)
+        Repo.clone_from(url, layer_dir, depth=1)
+    else:
+        pytest.skip(f"The {name} layer is not available without --yocto-network")
+
+
+@pytest.fixture(scope="session")
+def yocto_layers_dir(request, project_dirs):
+    layers_dir = project_dirs.shared_dir / "layers"
+    mirror_dir = request.config.getoption("yocto_mirror")
+    network = request.config.getoption("yocto_network")
+
+    # The layers are cloned once for all the workers of the session.
+    with shared_lock(layers_dir.with_suffix(".lock")):
+        for name, url in YOCTO_LAYERS.items():
+            if not (layers_dir / name).is_dir():
+                yocto_layer_clone(name, url, layers_dir / name, mirror_dir, network)
 
     return layers_dir
 
 
+# The shared images of each container directory use their own project ID, as
+# their container IDs are the same (e.g. simple/debian-12 and yocto/debian-12).
+def shared_project_id(container):
+    if container and "/" in container:
+        return f"test-{container.split('/')[0]}"
+
+    return "test"
+
+
+# The images of the tests which are not marked as isolated are built or pulled
+# once for all the workers of the session, and are then used read-only, as all
+# these tests use the same project ID.
+@pytest.fixture(scope="session")
+def shared_image(project_dirs):
+    def _shared_image(container_engine, container):
+        name = f"{container_engine}-{(container or 'default').replace('/', '-')}"
+        image_dir = project_dirs.shared_dir / "images" / name
+
+        with shared_lock(image_dir.with_suffix(".lock")):
+            if (image_dir / "ready").exists():
+                return
+
+            logger.info(f"Preparing the shared {container_engine} image of {name}")
+
+            project = Project(
+                root_dir=image_dir,
+                project_dirs=project_dirs,
+                container_engine=container_engine,
+                id=shared_project_id(container),
+                defconfig="hello_defconfig",
+                env={"OB_CONTAINER": container} if container else {},
+            )
+            project.make()
+
+            (image_dir / "ready").touch()
+
+    return _shared_image
+
+
+# The base images are pulled once for all the workers of the session.
+@pytest.fixture(scope="session")
+def shared_pull(project_dirs):
+    def _shared_pull(container_engine, name):
+        pull_name = re.sub(r"[^\w.-]", "-", name)
+        pull_dir = project_dirs.shared_dir / "pulls" / f"{container_engine}-{pull_name}"
+
+        with shared_lock(pull_dir.with_suffix(".lock")):
+            if (pull_dir / "ready").exists():
+                return
+
+            logger.info(f"Pulling the shared {container_engine} image {name}")
+
+            command_run(container_engine, "pull", name, _quiet=True)
+
+            pull_dir.mkdir(parents=True, exist_ok=True)
+            (pull_dir / "ready").touch()
+
+    return _shared_pull
+
+
+# Get the base images of a container, from the FROM lines of its Dockerfile.
+def container_bases(container_dir, container):
+    bases = []
+    stages = set()
+
+    for line in (container_dir / container / "Dockerfile").read_text().splitlines():
+        words = [w for w in line.split() if not w.startswith("--")]
+
+        if len(words) < 2 or words[0].upper() != "FROM":  # noqa: PLR2004
+            continue
+
+        if words[1] not in stages:
+            bases.append(words[1])
+
+        if len(words) > 3 and words[2].upper() == "AS":  # noqa: PLR2004
+            stages.add(words[3])
+
+    return bases
+
+
+# Get the shared images used by the tests to be run, as (engine, container).
+def prebuild_images(config, items, available_container_engines):
+    options = [e for e in CONTAINER_ENGINES if config.getoption(e)]
+    images = set()
+
+    for item in items:
+        params = item.callspec.params if hasattr(item, "callspec") else {}
+        engine = params.get("container_engine")
+
+        if (
+            engine not in available_container_engines
+            or (options and engine not in options)
+            or item.get_closest_marker("isolated")
+            or item.get_closest_marker("skip")
+        ):
+            continue
+
+        images.add((engine, params.get("container")))
+
+    return images
+
+
+# Get the dependency graph of the images: each one depends on the pull of its
+# external base images, or on the build of its local ones.
+def prebuild_graph(rootpath, container_dir, images):
+    containers = {
+        get_container_tag(
+            shared_project_id(container), container.split("/")[-1]
+        ): container
+        for container in iter_containers(rootpath)
+    }
+
+    graph = {}
+
+    def add_image(engine, container):
+        node = ("build", engine, container)
+
+        if node in graph:
+            return
+
+        graph[node] = set()
+
+        for base in container_bases(container_dir, container or "default"):
+            if base in containers:
+                add_image(engine, containers[base])
+                graph[node].add(("build", engine, containers[base]))
+            else:
+                graph[node].add(("pull", engine, base))
+
+    for engine, container in sorted(images, key=str):
+        add_image(engine, container)
+
+    return graph
+
+
+# Before the first test, the shared images needed by the selected tests are
+# prepared concurrently. They are ordered using the FROM lines of their
+# Dockerfile: the external base images are pulled first, once for all the
+# images and all the workers using them, and the images based on another one
+# are built after it. Each worker runs this for the tests of the session, the
+# shared images and pulls being prepared by the first worker needing them.
+@pytest.fixture(scope="session", autouse=True)
+def _prebuild_images(
+    request, project_dirs, available_container_engines, shared_image, shared_pull
+):
+    jobs = request.config.getoption("prebuild_jobs")
+
+    if jobs <= 0:
+        return
+
+    images = prebuild_images(
+        request.config, request.session.items, available_container_engines
+    )
+
+    graph = prebuild_graph(request.config.rootpath, project_dirs.container_dir, images)
+
+    def prepare(node):
+        action, engine, name = node
+
+        if action == "pull":
+            shared_pull(engine, name)
+        else:
+            shared_image(engine, name)
+
+    sorter = graphlib.TopologicalSorter(graph)
+    sorter.prepare()
+
+    logger.info(f"Preparing {len(images)} shared images using {jobs} jobs")
+
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        running = {}
+
+        while sorter.is_active():
+            for node in sorter.get_ready():
+                running[executor.submit(prepare, node)] = node
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+
+            # A failure is left to the tests using the image.
+            for future in done:
+                node = running.pop(future)
+
+                if error := future.exception():
+                    logger.warning(f"Failed to {node[0]} {node[2]}: {error}")
+
+                sorter.done(node)
+
+
+# The isolated tests build, pull or remove their own images. They use their own
+# project ID, and so their own image tags, so that they can run concurrently
+# with the other tests. Their images are removed afterwards.
+@pytest.fixture
+def project_id(request):
+    if request.node.get_closest_marker("isolated") is None:
+        return "test"
+
+    digest = hashlib.sha256(request.node.nodeid.encode()).hexdigest()[:8]
+
+    return f"test-{XDIST_WORKER or 'main'}-{digest}"
+
+
+def project_images_rm(container_engine, project_id):
+    images = command_run(
+        container_engine,
+        "images",
+        "-q",
+        "--filter",
+        f"label=io.github.openbar.project_id={project_id}",
+        _quiet=True,
+    )
+
+    if images:
+        command_run(container_engine, "rmi", "-f", *set(images), _ok_code=[0, 1, 2])
+
+
 class Project:
     def __init__(self, root_dir, project_dirs, **kwargs):
         self.__config = {
@@ -257,8 +740,11 @@ def project_default_kwargs():
 
 
 @pytest.fixture
-def create_project(request, tmp_path, project_default_kwargs, project_dirs):
+def create_project(
+    request, tmp_path, project_default_kwargs, project_dirs, project_id, shared_image
+):
     engine = request.getfixturevalue("container_engine")
+    isolated = request.node.get_closest_marker("isolated") is not None
 
     def _create_project(**kwargs):
         if "root_dir" in kwargs:
@@ -268,12 +754,27 @@ def create_project(request, tmp_path, project_default_kwargs, project_dirs):
         else:
             root_dir = tmp_path
 
-        return Project(
+        # The default arguments are completed, not replaced, by the test ones.
+        kwargs = merge({}, project_default_kwargs, kwargs, strategy=Strategy.ADDITIVE)
+        container = kwargs.get("env", {}).get("OB_CONTAINER")
+
+        project = Project(
             root_dir=root_dir,
             project_dirs=project_dirs,
             container_engine=engine,
-            **project_default_kwargs,
+            id=project_id if isolated else shared_project_id(container),
             **kwargs,
         )
 
-    return _create_project
+        # The default images are shared, the custom ones are not.
+        default_container_dir = project.container_dir == project_dirs.container_dir
+
+        if engine and not isolated and default_container_dir:
+            shared_image(engine, container)
+
+        return project
+
+    yield _create_project
+
+    if engine and isolated:
+        project_images_rm(engine, project_id)
@@ -1,4 +1,5 @@
 import logging
+import os
 import re
 
 import pytest
@@ -53,6 +54,49 @@ def test_home(create_project):
     assert stdout[-1] == "/home/container"
 
 
+def test_user_image(create_project):
+    project = create_project(
+        defconfig="container_defconfig", env={"OB_CONTAINER_USER_IMAGE": "1"}
+    )
+
+    local_id = command_run("id", "-u")[0], command_run("id", "-g")[0]
+
+    stdout = project.make(".id")
+    matches = re.match(r"uid=(?P<uid>\d+).* gid=(?P<gid>\d+)", stdout[-1])
+    assert (matches["uid"], matches["gid"]) == local_id
+
+    stdout = project.make(".home")
+    assert stdout[-1] == "/home/container"
+
+
+def test_persistent_home(create_project, tmp_path):
+    home_dir = tmp_path / "home"
+    project = create_project(
+        defconfig="container_defconfig",
+        env={"OB_CONTAINER_PERSISTENT_HOME": "1", "OB_CONTAINER_HOME_DIR": home_dir},
+    )
+
+    assert project.make(".cache")[-1].strip() == "1"
+    assert project.make(".cache")[-1].strip() == "2"
+    assert (home_dir / ".cache/runs").stat().st_uid == os.getuid()
+
+    # No mount points are created inside the persistent home directory.
+    assert {path.name for path in home_dir.iterdir()} == {".cache"}
+
+
+def test_ccache(create_project, container, tmp_path):
+    ccache_dir = tmp_path / "ccache"
+    project = create_project(
+        defconfig="container_defconfig", env={"OB_CCACHE_DIR": ccache_dir}
+    )
+
+    stdout = project.make(".ccache")
+    assert str(ccache_dir / container.split("/")[-1]) in stdout
+
+    # The compiler cache is kept on the host, in a directory for each image.
+    assert [path.name for path in ccache_dir.iterdir()] == [container.split("/")[-1]]
+
+
 def test_volumes(create_project, project_dirs):
     test_file = project_dirs.session_dir / "test_dir/test_file"
     test_file.parent.mkdir(parents=True, exist_ok=True)
@@ -36,6 +36,8 @@ logger = logging.getLogger(__name__)
             {"cli": {"TEST_VAR": "value with spaces"}},
             "value with spaces",
         ),
+        # Variable with special characters is exported properly
+        ("base_defconfig", {"cli": {"TEST_VAR": "value#hash"}}, "value#hash"),
         # Undefined variable that have default value have their default value
         ("default_defconfig", {}, "default"),
         # Variable that have default value have their own value
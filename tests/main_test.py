@@ -1,8 +1,12 @@
+import json
 import logging
+import os
+import time
 
 import pytest
 
 from . import CommandError
+from . import command_run
 
 logger = logging.getLogger(__name__)
 
@@ -31,6 +35,42 @@ def test_help(create_project):
     assert "  main_defconfig" in stdout[configuration_index + 1 : usefull_index - 1]
 
 
+def test_help_targets_cache(create_project):
+    project = create_project(defconfig="main_defconfig")
+    targets_cache = project.root_dir / "build/.openbar/targets.mk"
+    assert not targets_cache.exists()
+
+    # The targets are saved when the configuration is loaded.
+    stdout = project.make("help")
+    assert "* foo" in stdout
+    assert targets_cache.exists()
+
+    # The shell completion uses the saved targets.
+    stdout = project.make(
+        "-npq",
+        ".DEFAULT",
+        cli={"__BASH_MAKE_COMPLETION__": "1"},
+        _ok_code=[0, 1, 2],
+    )
+    assert "foo: .forward" in stdout
+    assert "bar: .forward" in stdout
+
+    # The saved targets are not used once the configuration is modified.
+    (project.root_dir / "included.mk").write_text("")
+
+    with open(project.root_dir / ".config", "a", encoding="utf-8") as stream:
+        stream.write("qux:\n\techo Qux\ninclude included.mk\n")
+
+    stdout = project.make("help")
+    assert "* qux" in stdout
+
+    # Nor once a file included by the configuration is modified.
+    (project.root_dir / "included.mk").write_text("quux:\n\techo Quux\n")
+
+    stdout = project.make("help")
+    assert "* quux" in stdout
+
+
 def test_defconfig(create_project):
     project = create_project()
     assert not (project.root_dir / ".config").exists()
@@ -49,6 +89,7 @@ def test_all(create_project):
     assert stdout[-2:] == ["Foo", "Bar"]
 
 
+@pytest.mark.isolated
 def test_verbose(create_project):
     project = create_project(defconfig="main_defconfig", cli={"B": "1"})
 
@@ -124,6 +165,17 @@ def test_build_dir(create_project):
     assert "OB_BUILD_DIR=/tmp/absolute_dir" in stdout
 
 
+def test_internal_variables(create_project):
+    project = create_project(defconfig="main_defconfig")
+
+    # The internal variables of the configuration load are not exported.
+    stdout = project.make(".env")
+    names = [line.split("=")[0] for line in stdout if "=" in line]
+    assert "CONFIG_MAKEFILES" not in names
+    assert "ENV_FILE_CONTENT" not in names
+
+
+@pytest.mark.isolated
 def test_foreach(project_dirs, create_project):
     project = create_project(
         defconfig_dir=project_dirs.tests_data_dir / "foreach", cli={"B": "1"}
@@ -136,3 +188,167 @@ def test_foreach(project_dirs, create_project):
     for index, name in enumerate(["bar", "baz", "foo"]):
         assert stdout[3 * index + 0] == f"Build configured for {name}_defconfig"
         assert stdout[3 * index + 2] == f"Goodbye {name}"
+
+
+def test_foreach_parallel(project_dirs, create_project):
+    project = create_project(defconfig_dir=project_dirs.tests_data_dir / "foreach")
+    stdout = project.make("foreach", ".goodbye", cli={"J": "2"})
+    summary_index = stdout.index("Summary:")
+    for index, name in enumerate(["bar", "baz", "foo"]):
+        assert f"[PASS] {name}_defconfig" in " ".join(stdout[:summary_index])
+        assert stdout[summary_index + 1 + index].startswith(f"  PASS  {name}_")
+        log_file = project.root_dir / f"build/foreach/{name}_defconfig/foreach.log"
+        assert log_file.read_text().splitlines()[-1] == f"Goodbye {name}"
+    assert stdout[-1].startswith("3 passed, 0 failed")
+    assert not (project.root_dir / ".config").exists()
+
+
+@pytest.mark.isolated
+def test_container_session(create_project):
+    project = create_project(
+        defconfig="main_defconfig", env={"OB_CONTAINER_SESSION": "1"}
+    )
+
+    def list_sessions():
+        return command_run(
+            project.container_engine,
+            "ps",
+            "-q",
+            "--filter",
+            f"label=io.github.openbar.project_id={project.id}",
+            "--filter",
+            "label=io.github.openbar.session",
+        )
+
+    assert project.make("foo")[-1] == "Foo"
+    sessions = list_sessions()
+    assert len(sessions) == 1
+
+    # The same session container is reused.
+    assert project.make("bar")[-1] == "Bar"
+    assert list_sessions() == sessions
+
+    project.make("containerclean")
+    assert not list_sessions()
+
+
+def test_trace(create_project):
+    project = create_project(defconfig="main_defconfig")
+    trace_file = project.root_dir / "trace.json"
+    assert project.make("foo", env={"OB_TRACE": trace_file})[-1] == "Foo"
+
+    # The trace file uses the JSON array format, without the closing bracket.
+    events = json.loads(trace_file.read_text().rstrip().rstrip(",") + "]")
+    names = {e["name"] for e in events if e["ph"] == "B"}
+    assert "parse core/main.mk" in names
+    assert f"core/container/{project.container_engine}.mk" in names
+    assert "core/type/simple.mk" in names
+    assert "parse core/type/simple.mk" in names
+    assert "config-parse" in names
+    assert "foo" in names
+
+    for name in names:
+        begin = [e for e in events if e["name"] == name and e["ph"] == "B"]
+        end = [e for e in events if e["name"] == name and e["ph"] == "E"]
+        assert len(begin) == len(end)
+        assert all(b["ts"] <= e["ts"] for b, e in zip(begin, end))
+
+
+def test_jobs(create_project):
+    project = create_project(defconfig="main_defconfig")
+
+    # The jobs are not lost by the layers, whatever the jobserver style.
+    stdout = project.make("-j2", ".jobs")
+    assert "-j2" in stdout[-1].split()
+
+
+def test_container_jobserver(create_project):
+    project = create_project(
+        defconfig="main_defconfig", env={"OB_CONTAINER_JOBSERVER": "1"}
+    )
+    jobserver_dir = project.root_dir / "build/.openbar/jobserver"
+
+    stdout = project.make("-j2", ".jobs")
+    assert "-j2" in stdout[-1].split()
+    assert not list(jobserver_dir.glob("*.fifo"))
+
+    # The FIFO jobserver is only given to a make supporting it (GNU make 4.4
+    # or later), the older ones use their own jobs.
+    if "jobserver-fifo" in project.make(".features")[-1].split():
+        assert f"--jobserver-auth=fifo:{jobserver_dir}/" in stdout[-1]
+    else:
+        assert "--jobserver-auth=fifo:" not in stdout[-1]
+
+
+def test_cacheclean(create_project):
+    project = create_project(defconfig="main_defconfig")
+    sstate_dir = project.root_dir / "sstate-cache"
+    (sstate_dir / "00").mkdir(parents=True)
+
+    for name, age in (("old", 3), ("new", 2)):
+        path = sstate_dir / "00" / f"sstate:{name}.tar.zst"
+        path.write_bytes(bytes(1024))
+        path.with_name(f"{path.name}.siginfo").touch()
+        atime = time.time() - age * 86400
+        os.utime(path, (atime, atime))
+        os.utime(path.with_name(f"{path.name}.siginfo"), (atime, atime))
+
+    stdout = project.make(
+        "cacheclean", cli={"SSTATE_DIR": sstate_dir, "OB_SSTATE_BUDGET": "1K"}
+    )
+    assert stdout[-1].startswith(f"{sstate_dir}: removed 1 entries")
+    assert sorted(path.name for path in sstate_dir.rglob("*")) == [
+        "00",
+        "sstate:new.tar.zst",
+        "sstate:new.tar.zst.siginfo",
+    ]
+
+
+def test_cacheclean_repository(create_project):
+    project = create_project(defconfig="main_defconfig")
+    dl_dir = project.root_dir / "downloads"
+    mirror_dir = dl_dir / "git2/git.example.com.repo"
+    (mirror_dir / "objects/pack").mkdir(parents=True)
+
+    # The bare git mirrors have no ".git" suffix.
+    files = {
+        mirror_dir / "objects/pack/pack-1.pack": (1024, 4),
+        mirror_dir / "HEAD": (16, 2),
+        dl_dir / "file.tar.gz": (1024, 3),
+        dl_dir / "file.tar.gz.done": (0, 3),
+    }
+
+    for path, (size, age) in files.items():
+        path.write_bytes(bytes(size))
+        atime = time.time() - age * 86400
+        os.utime(path, (atime, atime))
+
+    stdout = project.make("cacheclean", cli={"DL_DIR": dl_dir, "OB_DL_BUDGET": "2K"})
+    assert stdout[-1].startswith(f"{dl_dir}: removed 1 entries")
+    assert sorted(path.name for path in mirror_dir.rglob("*")) == [
+        "HEAD",
+        "objects",
+        "pack",
+        "pack-1.pack",
+    ]
+    assert not (dl_dir / "file.tar.gz").exists()
+
+
+@pytest.mark.isolated
+def test_containers(create_project, tmp_path):
+    defconfig_dir = tmp_path / "defconfigs"
+    defconfig_dir.mkdir()
+
+    for name in ("first", "second"):
+        (defconfig_dir / f"{name}_defconfig").write_text("hello:\n\techo Hello\n")
+
+    project = create_project(defconfig_dir=defconfig_dir)
+
+    # The image shared by both configurations is only built once.
+    stdout = project.make("containers", cli={"B": 1})
+    assert len([line for line in stdout if line.startswith("Building")]) == 1
+
+    project.make("first_defconfig")
+    stdout = project.make("hello")
+    assert not [line for line in stdout if line.startswith("Building")]
+    assert stdout[-1] == "Hello"
@@ -10,6 +10,8 @@ from . import get_container_tag
 
 logger = logging.getLogger(__name__)
 
+pytestmark = pytest.mark.isolated
+
 
 def check_make(project, check_fn, check_stdout, make_kwargs):
     if check_stdout is None:
@@ -290,6 +292,7 @@ def test_rebuild(
         ),
     ],
 )
+@pytest.mark.xdist_group("ghcr")
 def test_pull(create_project, initial_container, make_kwargs, check_stdout):
     project = create_project(defconfig="pull_defconfig")
     container_tag = "ghcr.io/openbar/openbar-alpine:latest"
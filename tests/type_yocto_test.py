@@ -21,11 +21,11 @@ class TestYocto:
             "env": {
                 "OB_CONTAINER": container,
                 "OB_CONTAINER_VOLUMES": yocto_layers_dir,
-                "DL_DIR": project_dirs.session_dir / "downloads",
-                "SSTATE_DIR": project_dirs.session_dir / "sstate-cache",
+                "DL_DIR": project_dirs.shared_dir / "downloads",
+                "SSTATE_DIR": project_dirs.shared_dir / "sstate-cache",
             },
             "cli": {
-                "BB_HASHSERVE_DB_DIR": project_dirs.session_dir / "sstate-cache",
+                "BB_HASHSERVE_DB_DIR": project_dirs.shared_dir / "sstate-cache",
             },
             "type": "yocto",
             "yocto_layers_dir": yocto_layers_dir,
@@ -46,3 +46,38 @@ class TestYocto:
             assert stdout[-3].endswith("all succeeded.")
         else:
             assert stdout[-1].endswith("all succeeded.")
+
+    def test_layers(self, create_project, yocto_layers_dir):
+        layer = yocto_layers_dir / "openembedded-core/meta-selftest"
+        project = create_project(
+            defconfig="type_yocto_layers_defconfig", env={"OB_YOCTO_LAYERS": layer}
+        )
+        bblayers = project.root_dir / "build/conf/bblayers.conf"
+
+        assert project.make("layers")[-1] == "1"
+        mtime = bblayers.stat().st_mtime_ns
+
+        # The layers are not configured again if nothing changed.
+        assert project.make("layers")[-1] == "1"
+        assert bblayers.stat().st_mtime_ns == mtime
+
+        # A manual modification is reverted.
+        with open(bblayers, "a", encoding="utf-8") as stream:
+            stream.write("# Modified\n")
+
+        assert project.make("layers")[-1] == "1"
+        assert "# Modified" not in bblayers.read_text()
+
+    def test_server(self, create_project):
+        project = create_project(defconfig="type_yocto_server_defconfig")
+        server_dir = project.root_dir / "yocto-server"
+
+        try:
+            stdout = project.make("server")
+        finally:
+            project.make("containerclean")
+
+        assert f'BB_HASHSERVE="unix://{server_dir}/hashserv.sock"' in stdout
+        assert f'PERSISTENT_DIR="{server_dir}/persistent"' in stdout
+        assert 'PRSERV_HOST="localhost:0"' in stdout
+        assert (server_dir / "hashserv.db").exists()